@@ -1,6 +1,7 @@
 import configparser
 import functools
 import os
+from pathlib import Path
 
 from fal_client.auth import MissingCredentialsError, FAL_RUN_HOST
 
@@ -46,6 +47,128 @@ def get_fal_api_key():
 
     return api_key
 
+def get_config_value(section: str, key: str, env_var: str, default, cast=str):
+    value = os.environ.get(env_var)
+
+    if value is None:
+        config = get_fal_config()
+        if section in config:
+            value = config[section].get(key)
+
+    if value is None or value == "":
+        return default
+
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"Invalid value {value!r} for {env_var}, using {default!r}")
+        return default
+
+
+def _parse_bool(value: str) -> bool:
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(value)
+
+
+def get_upload_concurrency() -> int:
+    return max(1, get_config_value("upload", "concurrency", "FAL_UPLOAD_CONCURRENCY", 4, int))
+
+
+def get_cache_dir() -> Path:
+    default_cache_dir = Path.home() / ".cache" / "comfyui-fal-connector"
+    return Path(get_config_value("cache", "dir", "FAL_CACHE_DIR", default_cache_dir, Path))
+
+
+def get_upload_cache_ttl() -> float:
+    # fal media URLs are not kept forever, re-upload once an entry gets too old.
+    return get_config_value("upload", "cache_ttl", "FAL_UPLOAD_CACHE_TTL", 7 * 24 * 3600, float)
+
+
+def get_http_client_settings() -> dict:
+    return {
+        "max_connections": get_config_value("http", "max_connections", "FAL_HTTP_MAX_CONNECTIONS", 100, int),
+        "max_keepalive_connections": get_config_value("http", "max_keepalive_connections", "FAL_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20, int),
+        "keepalive_expiry": get_config_value("http", "keepalive_expiry", "FAL_HTTP_KEEPALIVE_EXPIRY", 30.0, float),
+        "http2": get_config_value("http", "http2", "FAL_HTTP2", False, _parse_bool),
+        "connect_timeout": get_config_value("http", "connect_timeout", "FAL_HTTP_CONNECT_TIMEOUT", 10.0, float),
+        # The execution stream can stay quiet while a long workflow is running.
+        "read_timeout": get_config_value("http", "read_timeout", "FAL_HTTP_READ_TIMEOUT", 600.0, float),
+        "write_timeout": get_config_value("http", "write_timeout", "FAL_HTTP_WRITE_TIMEOUT", 60.0, float),
+        "pool_timeout": get_config_value("http", "pool_timeout", "FAL_HTTP_POOL_TIMEOUT", 30.0, float),
+    }
+
+
+def get_download_settings() -> dict:
+    return {
+        "max_connections": max(1, get_config_value("download", "max_connections", "FAL_DOWNLOAD_MAX_CONNECTIONS", 8, int)),
+        "segment_size_in_mb": max(1, get_config_value("download", "segment_size_mb", "FAL_DOWNLOAD_SEGMENT_SIZE_MB", 64, int)),
+        "retries": max(0, get_config_value("download", "retries", "FAL_DOWNLOAD_RETRIES", 3, int)),
+        # (connect, read) timeouts in seconds; the read timeout applies to every
+        # socket read, so stalled connections fail and are retried.
+        "timeout": (
+            get_config_value("download", "connect_timeout", "FAL_DOWNLOAD_CONNECT_TIMEOUT", 10, float),
+            get_config_value("download", "read_timeout", "FAL_DOWNLOAD_READ_TIMEOUT", 60, float),
+        ),
+    }
+
+
+def get_weights_cache_settings() -> dict:
+    eviction_policy = get_config_value("weights", "eviction_policy", "FAL_WEIGHTS_EVICTION_POLICY", "lru").lower()
+    if eviction_policy not in ("lru", "lfu"):
+        print(f"Unknown eviction policy {eviction_policy!r}, using 'lru'")
+        eviction_policy = "lru"
+
+    return {
+        # 0 disables eviction
+        "max_size": int(get_config_value("weights", "max_size_gb", "FAL_WEIGHTS_MAX_SIZE_GB", 0.0, float) * 1024**3),
+        "eviction_policy": eviction_policy,
+        # Entries used this recently are considered part of the running prompt.
+        "min_age": get_config_value("weights", "eviction_min_age", "FAL_WEIGHTS_EVICTION_MIN_AGE", 600.0, float),
+    }
+
+
+def get_download_max_workers() -> int:
+    return max(1, get_config_value("download", "max_workers", "FAL_DOWNLOAD_MAX_WORKERS", 4, int))
+
+
+def get_prefetch_concurrency() -> int:
+    return max(1, get_config_value("download", "prefetch_concurrency", "FAL_PREFETCH_CONCURRENCY", 2, int))
+
+
+def get_lora_cache_size() -> int:
+    return get_config_value("cache", "lora_cache_mb", "FAL_LORA_CACHE_MB", 1024, int) * 1024 * 1024
+
+
+def get_image_cache_settings() -> dict:
+    return {
+        "memory_size": get_config_value("cache", "image_cache_mb", "FAL_IMAGE_CACHE_MB", 512, int) * 1024 * 1024,
+        "ttl": get_config_value("cache", "image_cache_ttl", "FAL_IMAGE_CACHE_TTL", 300, float),
+    }
+
+
+def get_image_max_download_size() -> int:
+    return get_config_value("download", "image_max_size_mb", "FAL_IMAGE_MAX_DOWNLOAD_MB", 100, int) * 1024 * 1024
+
+
+def get_checkpoint_cache_size() -> int:
+    return get_config_value(
+        "cache", "checkpoint_cache_size", "FAL_CHECKPOINT_CACHE_SIZE", 0, int
+    )
+
+
+def get_lora_mmap() -> bool:
+    return get_config_value("cache", "lora_mmap", "FAL_LORA_MMAP", False, _parse_bool)
+
+
+def get_hf_hub_cache_enabled() -> bool:
+    return get_config_value(
+        "huggingface", "use_hub_cache", "FAL_HF_HUB_CACHE", False, _parse_bool
+    )
+
+
 def get_hf_token():
     hf_token = os.environ.get("HF_TOKEN")
     
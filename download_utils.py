@@ -1,18 +1,53 @@
+import functools
 import hashlib
+import json
 import os
 import re
 import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from pathlib import Path, PurePath
+from typing import NamedTuple
 from urllib.parse import unquote, urlparse
 
+from .config import (
+    get_download_settings,
+    get_hf_hub_cache_enabled,
+    get_hf_token,
+    get_weights_cache_settings,
+)
+from .weights_manifest import MANIFEST_FILE_NAME, WeightsEntry, WeightsManifest
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 TEMP_FILE_SUFFIX = ".tmp"
+PARTIAL_FILE_SUFFIX = ".part" + TEMP_FILE_SUFFIX
+PARTIAL_STATE_SUFFIX = ".state" + TEMP_FILE_SUFFIX
 
 # copied from https://github.com/fal-ai/fal/blob/74783409d0bc777de549f6534ee3a64053d169b7/projects/fal/src/fal/toolkit/utils/download_utils.py#L13-L40
 class DownloadError(Exception):
     pass
 
 
+class RemoteFileProperties(NamedTuple):
+    file_name: str
+    content_length: int
+    etag: str | None
+    last_modified: str | None
+    # End of the redirect chain, e.g. a signed CDN URL. Only valid for a short
+    # time, so it is reused by the download that follows the probe, not stored.
+    final_url: str
+    supports_ranges: bool
+    # Digest published by the upstream host, if any
+    sha256: str | None = None
+
+
 def _hash_url(url: str) -> str:
     """Hashes a URL using SHA-256.
 
@@ -26,10 +61,18 @@ def _hash_url(url: str) -> str:
 
 
 FAL_MODEL_WEIGHTS_DIR = PurePath("/data") / ".fal" / "model_weights"
+# Weights are stored once per content digest. Each URL's directory holds a
+# link to the blob, so mirrors of the same file share disk space.
+FAL_WEIGHTS_BLOBS_DIR = FAL_MODEL_WEIGHTS_DIR / "blobs" / "sha256"
 
 _REQUEST_HEADERS = {"User-Agent": f"fal-client (python)"}
 
 
+@functools.cache
+def get_weights_manifest() -> WeightsManifest:
+    return WeightsManifest(Path(FAL_MODEL_WEIGHTS_DIR) / MANIFEST_FILE_NAME)
+
+
 def get_civitai_headers() -> dict[str, str]:
     headers: dict[str, str] = {}
 
@@ -47,10 +90,10 @@ def get_civitai_headers() -> dict[str, str]:
 def get_huggingface_headers() -> dict[str, str]:
     headers: dict[str, str] = {}
 
-    hf_token = os.getenv("HF_TOKEN", None)
+    hf_token = get_hf_token()
 
     if not hf_token:
-        print("HF_TOKEN is not set in the environment variables.")
+        print("HF_TOKEN is not set in the environment variables or fal-config.ini.")
         return headers
 
     headers["Authorization"] = f"Bearer {hf_token}"
@@ -62,6 +105,400 @@ def get_local_file_content_length(file_path: Path) -> int:
     return file_path.stat().st_size
 
 
+def _parse_content_length(headers) -> int | None:
+    content_length = headers.get("Content-Length", None)
+    if content_length is None or not content_length.strip().isdigit():
+        return None
+    return int(content_length)
+
+
+def _supports_ranges(headers) -> bool:
+    return headers.get("Accept-Ranges", "").strip().lower() == "bytes"
+
+
+def _get_range_headers(
+    original_url: str, final_url: str, request_headers: dict[str, str]
+) -> dict[str, str]:
+    # Ranged requests go straight to the final URL of the redirect chain. If that
+    # is a different host (e.g. a signed CDN URL), do not leak credentials to it.
+    if urlparse(original_url).netloc == urlparse(final_url).netloc:
+        return dict(request_headers)
+
+    return {
+        key: value
+        for key, value in request_headers.items()
+        if key.lower() != "authorization"
+    }
+
+
+def _get_strong_validator(etag: str | None, last_modified: str | None) -> str | None:
+    # If-Range only accepts strong validators, weak ETags cannot be used to resume.
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified
+
+
+class _DownloadState:
+    """Tracks which byte ranges of a partial download are already on disk.
+
+    The state is saved next to the partial file, so an interrupted download can
+    be resumed with range requests as long as the remote file did not change.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        validator: str | None,
+        size: int | None,
+        completed: list[list[int]] | None = None,
+        path: Path | None = None,
+    ):
+        self.url = url
+        self.validator = validator
+        self.size = size
+        self.completed = completed or []
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_saved_at = 0.0
+
+    @classmethod
+    def load(cls, path: Path) -> "_DownloadState | None":
+        import json
+
+        try:
+            data = json.loads(path.read_text())
+            return cls(
+                data["url"], data["validator"], data["size"], data["completed"], path
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_resumable_from(self, previous: "_DownloadState | None") -> bool:
+        return (
+            previous is not None
+            and previous.url == self.url
+            and previous.size == self.size
+            and self.validator is not None
+            and previous.validator == self.validator
+        )
+
+    def add(self, start: int, end: int):
+        with self._lock:
+            ranges = sorted([*self.completed, [start, end]])
+            merged = [ranges[0]]
+            for range_start, range_end in ranges[1:]:
+                if range_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], range_end)
+                else:
+                    merged.append([range_start, range_end])
+            self.completed = merged
+
+        # Persist progress regularly so it survives the process being killed.
+        if time.monotonic() - self._last_saved_at > 1:
+            self.save()
+
+    def reset(self):
+        with self._lock:
+            self.completed = []
+
+    def contiguous_end(self) -> int:
+        with self._lock:
+            if self.completed and self.completed[0][0] == 0:
+                return self.completed[0][1]
+            return 0
+
+    def completed_bytes(self) -> int:
+        with self._lock:
+            return sum(end - start for start, end in self.completed)
+
+    def missing_ranges(self, segment_size: int) -> list[tuple[int, int]]:
+        missing = []
+        position = 0
+        with self._lock:
+            gaps = [*self.completed, [self.size, self.size]]
+
+        for range_start, range_end in gaps:
+            for start in range(position, range_start, segment_size):
+                missing.append((start, min(start + segment_size, range_start)))
+            position = max(position, range_end)
+
+        return missing
+
+    def is_complete(self) -> bool:
+        return self.size is None or self.missing_ranges(self.size or 1) == []
+
+    def save(self):
+        import json
+
+        if self.path is None:
+            return
+
+        with self._lock:
+            self._last_saved_at = time.monotonic()
+            data = {
+                "url": self.url,
+                "validator": self.validator,
+                "size": self.size,
+                "completed": self.completed,
+            }
+            temp_path = self.path.with_name(
+                self.path.name.removesuffix(TEMP_FILE_SUFFIX) + ".new" + TEMP_FILE_SUFFIX
+            )
+            temp_path.write_text(json.dumps(data))
+            os.replace(temp_path, self.path)
+
+
+# Memory shared by all downloads in the process for chunks downloaded ahead
+# of their hash offset. Chunks that do not fit are read back from disk.
+STREAMING_HASH_BUFFER_SIZE = 512 * 1024 * 1024
+
+_hash_buffer_lock = threading.Lock()
+_hash_buffer_used = 0
+
+
+def _reserve_hash_buffer(size: int) -> bool:
+    global _hash_buffer_used
+
+    with _hash_buffer_lock:
+        if _hash_buffer_used + size > STREAMING_HASH_BUFFER_SIZE:
+            return False
+        _hash_buffer_used += size
+        return True
+
+
+def _release_hash_buffer(size: int):
+    global _hash_buffer_used
+
+    with _hash_buffer_lock:
+        _hash_buffer_used -= size
+
+
+class _StreamingHasher:
+    """SHA-256 of a file whose chunks may be written out of order.
+
+    Chunks written at the current hash offset are hashed straight from memory.
+    Chunks that arrive early (parallel ranges) are kept in memory until
+    everything before them is hashed, up to ``buffer_size`` bytes per download
+    and ``STREAMING_HASH_BUFFER_SIZE`` bytes across all downloads. Only chunks
+    beyond that budget, and ranges written by an earlier attempt, are read back
+    from the file. No byte is hashed twice and there is no separate pass over
+    the finished file.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        state: _DownloadState,
+        block_size: int,
+        buffer_size: int,
+    ):
+        self.file_path = file_path
+        self.state = state
+        self.block_size = block_size
+        self.buffer_size = buffer_size
+        self.offset = 0
+        self._sha256 = hashlib.sha256()
+        self._pending: dict[int, bytes] = {}
+        self._pending_size = 0
+        self._lock = threading.Lock()
+
+    def update(self, offset: int, chunk: bytes):
+        with self._lock:
+            if offset == self.offset:
+                self._sha256.update(chunk)
+                self.offset += len(chunk)
+            elif (
+                offset > self.offset
+                and self._pending_size + len(chunk) <= self.buffer_size
+                and _reserve_hash_buffer(len(chunk))
+            ):
+                self._pending[offset] = chunk
+                self._pending_size += len(chunk)
+            self._catch_up()
+
+    def _catch_up(self):
+        contiguous_end = self.state.contiguous_end()
+        f = None
+
+        try:
+            while True:
+                chunk = self._pending.pop(self.offset, None)
+                if chunk is not None:
+                    self._pending_size -= len(chunk)
+                    _release_hash_buffer(len(chunk))
+                    self._sha256.update(chunk)
+                    self.offset += len(chunk)
+                    continue
+
+                if self.offset >= contiguous_end:
+                    break
+
+                # Bytes that were not buffered are read from the file, up to
+                # the next buffered chunk.
+                read_end = min(
+                    (start for start in self._pending if start > self.offset),
+                    default=contiguous_end,
+                )
+                read_end = min(read_end, contiguous_end)
+                if f is None:
+                    f = open(self.file_path, "rb")
+                f.seek(self.offset)
+                while self.offset < read_end:
+                    block = f.read(min(self.block_size, read_end - self.offset))
+                    if not block:
+                        return
+                    self._sha256.update(block)
+                    self.offset += len(block)
+        finally:
+            if f is not None:
+                f.close()
+
+            # Chunks the offset moved past are on disk and no longer needed.
+            for start in [start for start in self._pending if start < self.offset]:
+                self._discard(start)
+
+    def _discard(self, start: int):
+        size = len(self._pending.pop(start))
+        self._pending_size -= size
+        _release_hash_buffer(size)
+
+    def hexdigest(self) -> str:
+        with self._lock:
+            self._catch_up()
+            return self._sha256.hexdigest()
+
+    def close(self):
+        """Give the buffered chunks back to the shared budget."""
+        with self._lock:
+            for start in list(self._pending):
+                self._discard(start)
+
+
+class _RemoteFileChangedError(DownloadError):
+    pass
+
+
+class _ChecksumMismatchError(DownloadError):
+    pass
+
+
+class _IncompleteDownloadError(DownloadError):
+    pass
+
+
+def _preallocate_file(file_path: Path, file_size: int):
+    if file_path.exists() and file_path.stat().st_size == file_size:
+        return
+
+    with open(file_path, "a+b") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, file_size)
+                return
+            except OSError:
+                pass
+        f.truncate(file_size)
+
+
+def _download_range(
+    url: str,
+    file_path: Path,
+    start: int,
+    end: int,
+    headers: dict[str, str],
+    chunk_size: int,
+    state: _DownloadState,
+    on_chunk,
+):
+    import requests
+
+    range_headers = {**headers, "Range": f"bytes={start}-{end - 1}"}
+    if state.validator:
+        range_headers["If-Range"] = state.validator
+
+    with requests.get(
+        url,
+        headers=range_headers,
+        stream=True,
+        timeout=get_download_settings()["timeout"],
+    ) as req:
+        req.raise_for_status()
+        if req.status_code != 206:
+            # Either ranges are not supported after all, or If-Range failed
+            # because the remote file changed since the download started.
+            raise _RemoteFileChangedError(f"Server did not honour range request for {url}")
+
+        # Unbuffered, so the hasher can read back what was written right away.
+        # Chunks reach on_chunk before they count as completed, so the hasher
+        # never reads back a chunk it is about to receive in memory.
+        with open(file_path, "r+b", buffering=0) as f:
+            f.seek(start)
+            position = start
+            for chunk in req.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    on_chunk(position, chunk)
+                    state.add(position, position + len(chunk))
+                    position += len(chunk)
+
+
+def _download_ranges(
+    url: str,
+    file_path: Path,
+    headers: dict[str, str],
+    chunk_size: int,
+    segment_size: int,
+    max_connections: int,
+    state: _DownloadState,
+    on_chunk,
+):
+    _preallocate_file(file_path, state.size)
+
+    segments = state.missing_ranges(segment_size)
+    if not segments:
+        return
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_connections, len(segments)),
+        thread_name_prefix="fal-download",
+    ) as executor:
+        futures = [
+            executor.submit(
+                _download_range,
+                url,
+                file_path,
+                start,
+                end,
+                headers,
+                chunk_size,
+                state,
+                on_chunk,
+            )
+            for start, end in segments
+        ]
+        for future in futures:
+            future.result()
+
+
+def _is_retryable_download_error(error: Exception) -> bool:
+    import requests
+
+    if isinstance(error, requests.HTTPError):
+        status_code = error.response.status_code if error.response is not None else 0
+        return status_code == 429 or status_code >= 500
+
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            _RemoteFileChangedError,
+            _IncompleteDownloadError,
+        ),
+    )
+
+
 def download_url_to_file(
     url: str,
     dst: str | Path,
@@ -69,9 +506,20 @@ def download_url_to_file(
     headers: dict[str, str] = None,
     chunk_size_in_mb=16,
     file_integrity_check_callback=None,
+    max_connections: int | None = None,
+    segment_size_in_mb: int | None = None,
+    resume: bool = False,
+    retries: int | None = None,
+    remote_file: RemoteFileProperties | None = None,
+    expected_sha256: str | None = None,
+    sha256_callback=None,
+    progress_callback=None,
 ) -> Path:
     """Download object at the given URL to a local path.
 
+    When the server supports range requests, the file is split into segments
+    that are downloaded concurrently into a preallocated temporary file.
+
     Args:
         url (str): URL of the object to download
         dst (str): Full path where object will be saved, e.g. ``/tmp/temporary_file``
@@ -83,62 +531,72 @@ def download_url_to_file(
             Default: 16
         file_integrity_check_callback (callable, optional): callback function to check file integrity
             Default: None
+        max_connections (int, optional): number of concurrent range requests
+            Default: ``FAL_DOWNLOAD_MAX_CONNECTIONS``
+        segment_size_in_mb (int, optional): size of each range request in MB
+            Default: ``FAL_DOWNLOAD_SEGMENT_SIZE_MB``
+        resume (bool, optional): keep partial downloads next to ``dst`` and resume
+            them with range requests on the next attempt
+            Default: False
+        retries (int, optional): number of retries with exponential backoff after
+            a transient failure
+            Default: ``FAL_DOWNLOAD_RETRIES``
+        remote_file (RemoteFileProperties, optional): result of a previous
+            ``_get_remote_file_properties`` call for ``url``, used to skip the
+            initial request and the redirect chain
+            Default: None
+        expected_sha256 (str, optional): SHA-256 the downloaded file must match
+            Default: None
+        sha256_callback (callable, optional): called with the SHA-256 of the
+            downloaded file, which is computed while the file is written
+            Default: None
+        progress_callback (callable, optional): called with the number of bytes
+            on disk and the total size (``None`` if unknown) after every chunk
+            Default: None
 
     """
-    from tqdm import tqdm
-
-    file_size = None
-
-    request_headers = {
-        **_REQUEST_HEADERS,
-        **(headers or {}),
-    }
+    download_settings = get_download_settings()
+    retries = download_settings["retries"] if retries is None else retries
 
     url = url.strip()
 
     if url.startswith("data:"):
         return _download_data_url_to_file(url, dst)
 
-    import requests
+    for attempt in range(retries + 1):
+        try:
+            sha256 = _download_url_to_file(
+                url,
+                Path(dst),
+                progress=progress,
+                request_headers={**_REQUEST_HEADERS, **(headers or {})},
+                chunk_size=chunk_size_in_mb * 1024 * 1024,
+                max_connections=max_connections
+                or download_settings["max_connections"],
+                segment_size=(
+                    segment_size_in_mb or download_settings["segment_size_in_mb"]
+                )
+                * 1024
+                * 1024,
+                resume=resume,
+                remote_file=remote_file,
+                expected_sha256=expected_sha256,
+                progress_callback=progress_callback,
+            )
+            break
+        except Exception as e:
+            if attempt == retries or not _is_retryable_download_error(e):
+                raise
 
-    req = requests.get(url, headers=request_headers, stream=True, allow_redirects=True)
-    req.raise_for_status()
+            # The resolved URL may have expired, resolve it again on retry.
+            remote_file = None
 
-    headers = req.headers  # type: ignore
-    content_length = headers.get("Content-Length", None)  # type: ignore
-    if content_length is not None and len(content_length) > 0:
-        file_size = int(content_length[0])
+            delay = min(2**attempt, 60)
+            print(f"Download of {url} failed ({e}), retrying in {delay}s")
+            time.sleep(delay)
 
-    with tempfile.NamedTemporaryFile(
-        delete=False,
-        dir=os.path.dirname(dst),
-        suffix=TEMP_FILE_SUFFIX,
-    ) as temp_file:
-        file_path = temp_file.name
-        try:
-            with tqdm(
-                total=file_size,
-                disable=not progress,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as pbar, open(file_path, "wb") as f:
-                for chunk in req.iter_content(
-                    chunk_size=chunk_size_in_mb * 1024 * 1024
-                ):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-
-            # NOTE: Atomically renaming the file into place when the file is downloaded
-            # completely.
-            #
-            # Since the file used is temporary, in a case of an interruption, the
-            # downloaded content will be lost. So, it is safe to redownload the file in
-            # such cases.
-            os.rename(file_path, dst)
-        finally:
-            Path(temp_file.name).unlink(missing_ok=True)
+    if sha256_callback:
+        sha256_callback(sha256)
 
     if file_integrity_check_callback:
         file_integrity_check_callback(dst)
@@ -146,14 +604,242 @@ def download_url_to_file(
     return Path(dst)
 
 
-def _download_data_url_to_file(url: str, dst: str | Path):
+def _download_url_to_file(
+    url: str,
+    dst: Path,
+    progress: bool,
+    request_headers: dict[str, str],
+    chunk_size: int,
+    max_connections: int,
+    segment_size: int,
+    resume: bool,
+    remote_file: RemoteFileProperties | None,
+    expected_sha256: str | None,
+    progress_callback,
+) -> str:
+    import requests
+    from tqdm import tqdm
+
+    if (
+        remote_file is not None
+        and remote_file.supports_ranges
+        and remote_file.content_length >= 0
+    ):
+        # Everything needed is already known from the probe, go straight to
+        # range requests against the resolved URL.
+        req = None
+        final_url = remote_file.final_url
+        file_size = remote_file.content_length
+        supports_ranges = True
+        validator = _get_strong_validator(remote_file.etag, remote_file.last_modified)
+    else:
+        req = requests.get(
+            url,
+            headers=request_headers,
+            stream=True,
+            allow_redirects=True,
+            timeout=get_download_settings()["timeout"],
+        )
+        req.raise_for_status()
+
+        final_url = req.url
+        file_size = _parse_content_length(req.headers)
+        supports_ranges = file_size is not None and _supports_ranges(req.headers)
+        validator = _get_strong_validator(
+            req.headers.get("ETag"), req.headers.get("Last-Modified")
+        )
+
+    state = _DownloadState(url, validator, file_size)
+
+    if resume:
+        # Partial downloads are kept under a deterministic name, so the next
+        # attempt (or the next process) can pick up where this one stopped.
+        file_path = Path(f"{dst}{PARTIAL_FILE_SUFFIX}")
+        state.path = Path(f"{dst}{PARTIAL_STATE_SUFFIX}")
+
+        previous_state = _DownloadState.load(state.path)
+        if supports_ranges and file_path.exists() and state.is_resumable_from(
+            previous_state
+        ):
+            state.completed = previous_state.completed
+        else:
+            file_path.unlink(missing_ok=True)
+    else:
+        with tempfile.NamedTemporaryFile(
+            delete=False,
+            dir=os.path.dirname(dst),
+            suffix=TEMP_FILE_SUFFIX,
+        ) as temp_file:
+            file_path = Path(temp_file.name)
+
+    use_ranges = supports_ranges and (
+        req is None
+        or state.completed
+        or (max_connections > 1 and file_size > segment_size)
+    )
+
+    # Enough to hold about one chunk ahead per connection.
+    hasher = _StreamingHasher(
+        file_path, state, chunk_size, max_connections * chunk_size
+    )
+
+    try:
+        with tqdm(
+            total=file_size,
+            initial=state.completed_bytes(),
+            disable=not progress,
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as pbar:
+            pbar_lock = threading.Lock()
+
+            def on_chunk(offset: int, chunk: bytes):
+                hasher.update(offset, chunk)
+                with pbar_lock:
+                    pbar.update(len(chunk))
+                    if progress_callback:
+                        progress_callback(pbar.n, file_size)
+
+            if use_ranges:
+                if req is not None:
+                    req.close()
+                _download_ranges(
+                    final_url,
+                    file_path,
+                    _get_range_headers(url, final_url, request_headers),
+                    chunk_size,
+                    segment_size,
+                    max_connections,
+                    state,
+                    on_chunk,
+                )
+            else:
+                with req, open(file_path, "wb", buffering=0) as f:
+                    position = 0
+                    for chunk in req.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            on_chunk(position, chunk)
+                            state.add(position, position + len(chunk))
+                            position += len(chunk)
+
+        if not state.is_complete():
+            raise _IncompleteDownloadError(f"Download of {url} is incomplete")
+
+        sha256 = hasher.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise _ChecksumMismatchError(
+                f"SHA-256 of {url} is {sha256}, expected {expected_sha256}"
+            )
+
+        # NOTE: Atomically renaming the file into place when the file is downloaded
+        # completely.
+        #
+        # Partial downloads are either temporary files that are removed below, or
+        # resumable files that are only renamed once every byte range is on disk.
+        os.rename(file_path, dst)
+
+        if state.path is not None:
+            state.path.unlink(missing_ok=True)
+            state.path = None
+
+        return sha256
+
+    except (_RemoteFileChangedError, _ChecksumMismatchError):
+        # The partial content belongs to an older version of the file, or is
+        # corrupt. Either way, it cannot be resumed.
+        state.reset()
+        file_path.unlink(missing_ok=True)
+        if state.path is not None:
+            state.path.unlink(missing_ok=True)
+            state.path = None
+        raise
+
+    finally:
+        hasher.close()
+        if resume:
+            state.save()
+        else:
+            file_path.unlink(missing_ok=True)
+
+
+class DownloadedContent(NamedTuple):
+    data: bytes
+    etag: str | None
+    last_modified: str | None
+
+
+def download_url_to_bytes(
+    url: str,
+    headers: dict[str, str] | None = None,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    max_size: int | None = None,
+    chunk_size_in_mb=1,
+) -> DownloadedContent | None:
+    """Download the object at ``url`` into memory, without a temporary file.
+
+    Given the validators of a copy downloaded earlier, the request is
+    conditional and None is returned if that copy is still current. Objects
+    larger than ``max_size`` bytes raise a DownloadError before (or as soon as)
+    that many bytes have been received.
+    """
+    if url.startswith("data:"):
+        return DownloadedContent(decode_data_url(url, max_size), None, None)
+
+    import requests
+
+    request_headers = {**_REQUEST_HEADERS, **(headers or {})}
+    if etag:
+        request_headers["If-None-Match"] = etag
+    elif last_modified:
+        request_headers["If-Modified-Since"] = last_modified
+
+    with requests.get(
+        url,
+        headers=request_headers,
+        stream=True,
+        timeout=get_download_settings()["timeout"],
+    ) as response:
+        if response.status_code == 304 and (etag or last_modified):
+            return None
+
+        response.raise_for_status()
+
+        content_length = _parse_content_length(response.headers)
+        if max_size is not None and (content_length or 0) > max_size:
+            raise DownloadError(f"{url} is larger than {max_size} bytes")
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(int(chunk_size_in_mb * 1024 * 1024)):
+            chunks.append(chunk)
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise DownloadError(f"{url} is larger than {max_size} bytes")
+
+        return DownloadedContent(
+            b"".join(chunks),
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+
+def decode_data_url(url: str, max_size: int | None = None) -> bytes:
     import base64
 
-    data = url.split(",")[1]
-    data = base64.b64decode(data)
+    data = url.split(",", 1)[1]
+    # Base64 encodes 3 bytes in 4 characters.
+    if max_size is not None and len(data) * 3 // 4 > max_size:
+        raise DownloadError(f"data: URL is larger than {max_size} bytes")
+
+    return base64.b64decode(data)
 
+
+def _download_data_url_to_file(url: str, dst: str | Path):
     with open(dst, "wb") as fp:
-        fp.write(data)
+        fp.write(decode_data_url(url))
 
     return Path(dst)
 
@@ -170,44 +856,445 @@ def download_model_weights(url: str, force: bool = False) -> Path:
     return download_model_weights_fal(url, request_headers=headers, force=force)
 
 
+_inflight_downloads_lock = threading.Lock()
+# url hash -> (result of the running download, whether it was forced)
+_inflight_downloads: dict[str, tuple[Future, bool]] = {}
+
+# (bytes on disk, total bytes) of the model weights being downloaded right now
+_download_progress: dict[str, tuple[int, int | None]] = {}
+
+
+def get_download_progress(url: str) -> tuple[int, int | None] | None:
+    return _download_progress.get(_hash_url(url))
+
+
+def _set_download_progress(url_hash: str, bytes_done: int, total_bytes: int | None):
+    _download_progress[url_hash] = (bytes_done, total_bytes)
+
+_download_stats_lock = threading.Lock()
+_download_stats = {
+    "singleflight_joins": 0,
+    "singleflight_wait_seconds": 0.0,
+    "file_lock_waits": 0,
+    "file_lock_wait_seconds": 0.0,
+    "blob_hits": 0,
+}
+
+
+def _add_download_stats(**increments):
+    with _download_stats_lock:
+        for name, increment in increments.items():
+            _download_stats[name] += increment
+
+
+def get_download_stats() -> dict:
+    with _download_stats_lock:
+        return dict(_download_stats)
+
+
+@contextmanager
+def _weights_file_lock(url_hash: str, blocking: bool = True):
+    """Serialize downloads of the same URL across processes on this host.
+
+    With ``blocking=False`` the context yields ``False`` instead of waiting when
+    another process holds the lock.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    lock_path = Path(FAL_MODEL_WEIGHTS_DIR / f"{url_hash}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not blocking:
+                yield False
+                return
+
+            print(f"Waiting for another process to finish downloading {lock_path.stem}")
+            started_at = time.perf_counter()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            wait_seconds = time.perf_counter() - started_at
+            _add_download_stats(file_lock_waits=1, file_lock_wait_seconds=wait_seconds)
+            print(f"Waited {wait_seconds:.2f}s for the download lock of {lock_path.stem}")
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_pinned_weights_lock = threading.Lock()
+_pinned_weights: dict[str, int] = {}
+
+
+@contextmanager
+def pinned_weights(*urls: str):
+    """Keep the weights of the given URLs from being evicted while in use."""
+    url_hashes = [_hash_url(url) for url in urls]
+
+    with _pinned_weights_lock:
+        for url_hash in url_hashes:
+            _pinned_weights[url_hash] = _pinned_weights.get(url_hash, 0) + 1
+
+    try:
+        yield
+    finally:
+        with _pinned_weights_lock:
+            for url_hash in url_hashes:
+                _pinned_weights[url_hash] -= 1
+                if _pinned_weights[url_hash] == 0:
+                    del _pinned_weights[url_hash]
+
+
+def _is_weights_in_use(entry: WeightsEntry, min_age: float) -> bool:
+    with _pinned_weights_lock:
+        if entry.url_hash in _pinned_weights:
+            return True
+    return time.time() - entry.last_access < min_age
+
+
+def _get_file_key(path: str) -> tuple[int, int] | str:
+    # Links to the same blob resolve to the same inode.
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return path
+    return (file_stat.st_dev, file_stat.st_ino)
+
+
+def _get_disk_size(entries: list[WeightsEntry]) -> int:
+    """Disk space used by ``entries``, counting shared blobs once."""
+    sizes = {_get_file_key(entry.path): entry.size for entry in entries}
+    return sum(sizes.values())
+
+
+def get_weights_usage() -> dict:
+    settings = get_weights_cache_settings()
+    entries = get_weights_manifest().entries()
+
+    return {
+        "total_size": _get_disk_size(
+            [entry for entry in entries if not entry.external]
+        ),
+        "max_size": settings["max_size"],
+        "eviction_policy": settings["eviction_policy"],
+        "entries": [
+            {
+                "url": entry.url,
+                "path": entry.path,
+                "size": entry.size,
+                "last_access": entry.last_access,
+                "access_count": entry.access_count,
+                "in_use": _is_weights_in_use(entry, settings["min_age"]),
+                "external": entry.external,
+            }
+            for entry in entries
+        ],
+    }
+
+
+def trim_model_weights(max_size: int | None = None) -> list[str]:
+    """Evict least recently (or least frequently) used weights until the
+    weights directory fits in ``max_size`` bytes.
+
+    Pinned weights, recently used weights and weights that another process is
+    downloading right now are never evicted. Files in the Hugging Face hub
+    cache are not managed here and neither count nor get evicted. Returns the
+    evicted URLs.
+
+    Without ``max_size`` the configured quota is used; when no quota is
+    configured (``0``), nothing is evicted.
+    """
+    settings = get_weights_cache_settings()
+    if max_size is None:
+        if settings["max_size"] <= 0:
+            return []
+        max_size = settings["max_size"]
+    manifest = get_weights_manifest()
+
+    entries = [entry for entry in manifest.entries() if not entry.external]
+    total_size = _get_disk_size(entries)
+    if total_size <= max_size:
+        return []
+
+    # Space is only freed once the last URL sharing a blob is evicted.
+    file_keys = {entry.url_hash: _get_file_key(entry.path) for entry in entries}
+    file_refs = Counter(file_keys.values())
+
+    if settings["eviction_policy"] == "lfu":
+        entries.sort(key=lambda entry: (entry.access_count, entry.last_access))
+    else:
+        entries.sort(key=lambda entry: entry.last_access)
+
+    evicted = []
+    for entry in entries:
+        if total_size <= max_size:
+            break
+
+        if _is_weights_in_use(entry, settings["min_age"]):
+            continue
+
+        with _weights_file_lock(entry.url_hash, blocking=False) as acquired:
+            if not acquired:
+                continue
+
+            manifest.remove(entry.url_hash)
+            weights_path = Path(entry.path)
+            weights_path.unlink(missing_ok=True)
+            try:
+                weights_path.parent.rmdir()
+            except OSError:
+                pass
+
+        file_key = file_keys[entry.url_hash]
+        file_refs[file_key] -= 1
+        if file_refs[file_key] == 0:
+            if entry.sha256:
+                _remove_blob(entry.sha256, file_key)
+            total_size -= entry.size
+
+        evicted.append(entry.url)
+        print(f"Evicted {entry.url} ({entry.size} bytes) from the weights cache")
+
+    return evicted
+
+
 def download_model_weights_fal(
     url: str, force: bool = False, request_headers: dict[str, str] | None = None
 ) -> Path:
-    weights_dir = Path(FAL_MODEL_WEIGHTS_DIR / _hash_url(url))
+    """Download model weights once, even if several threads or processes ask
+    for the same URL at the same time.
+
+    Concurrent callers in this process wait for the first caller and reuse its
+    result. Other processes wait on a per-URL file lock, after which they find
+    the downloaded file in place. A forced caller only reuses the result of
+    another forced download; otherwise it waits for the running download to
+    finish and then downloads the file again.
+    """
+    url_hash = _hash_url(url)
+
+    # Cache hits do not need any coordination.
+    if not force:
+        weights_path = _get_manifest_hit(url_hash)
+        if weights_path is not None:
+            return weights_path
+
+    while True:
+        with _inflight_downloads_lock:
+            inflight = _inflight_downloads.get(url_hash)
+            # A finished download may not have removed its entry yet.
+            if inflight is None or inflight[0].done():
+                future = Future()
+                _inflight_downloads[url_hash] = (future, force)
+                break
+
+        future, inflight_force = inflight
+        if force and not inflight_force:
+            # The running download may reuse the files a forced caller wants
+            # replaced. Wait for it, then start a forced download.
+            wait([future])
+            continue
+
+        started_at = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            _add_download_stats(
+                singleflight_joins=1,
+                singleflight_wait_seconds=time.perf_counter() - started_at,
+            )
+
+    try:
+        with pinned_weights(url), _weights_file_lock(url_hash):
+            weights_path = _download_model_weights_fal(
+                url, force=force, request_headers=request_headers
+            )
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(weights_path)
+    finally:
+        with _inflight_downloads_lock:
+            if _inflight_downloads.get(url_hash, (None,))[0] is future:
+                del _inflight_downloads[url_hash]
+        _download_progress.pop(url_hash, None)
+
+    if get_weights_cache_settings()["max_size"] > 0:
+        with pinned_weights(url):
+            trim_model_weights()
+
+    return weights_path
+
+
+def _get_manifest_hit(url_hash: str) -> Path | None:
+    entry = get_weights_manifest().get(url_hash)
+    if entry is None or not entry.validated:
+        return None
+
+    # A single stat guards against files removed behind the manifest's back.
+    try:
+        if os.stat(entry.path).st_size == entry.size:
+            get_weights_manifest().touch(url_hash)
+            return Path(entry.path)
+    except FileNotFoundError:
+        pass
+
+    get_weights_manifest().remove(url_hash)
+    return None
+
+
+def _get_blob_path(sha256: str) -> Path:
+    return Path(FAL_WEIGHTS_BLOBS_DIR / sha256)
+
+
+def _link_to_blob(blob_path: Path, weights_path: Path):
+    """Atomically replace ``weights_path`` with a link to ``blob_path``.
+
+    Hardlinks are preferred, so a URL's weights stay readable even after the
+    blob is removed. Symlinks are used where hardlinks are not supported.
+    """
+    link_path = weights_path.with_name(weights_path.name + ".link" + TEMP_FILE_SUFFIX)
+    link_path.unlink(missing_ok=True)
+    try:
+        os.link(blob_path, link_path)
+    except FileNotFoundError:
+        # A missing blob must not turn into a dangling symlink.
+        raise
+    except OSError:
+        os.symlink(blob_path, link_path)
+    os.replace(link_path, weights_path)
+
+
+def _store_blob(weights_path: Path, sha256: str):
+    """Add freshly downloaded weights to the blob store."""
+    blob_path = _get_blob_path(sha256)
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+
+    try:
+        os.link(weights_path, blob_path)
+    except FileExistsError:
+        # The same content was downloaded through another URL meanwhile.
+        _link_to_blob(blob_path, weights_path)
+    except OSError:
+        os.replace(weights_path, blob_path)
+        os.symlink(blob_path, weights_path)
+
+
+def _remove_blob(sha256: str, file_key: tuple[int, int] | str):
+    blob_path = _get_blob_path(sha256)
+    # Only remove the blob the evicted weights were linked to.
+    if _get_file_key(str(blob_path)) == file_key:
+        blob_path.unlink(missing_ok=True)
+
+
+def _get_blob_hit(remote_file: RemoteFileProperties, weights_path: Path) -> bool:
+    """Link ``weights_path`` to an existing blob with the upstream digest."""
+    if not remote_file.sha256:
+        return False
+
+    blob_path = _get_blob_path(remote_file.sha256)
+    weights_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        _link_to_blob(blob_path, weights_path)
+    except FileNotFoundError:
+        return False
+
+    _add_download_stats(blob_hits=1)
+    return True
+
+
+def _record_weights(
+    url: str,
+    weights_path: Path,
+    remote_file: RemoteFileProperties | None = None,
+    sha256: str | None = None,
+    external: bool = False,
+):
+    get_weights_manifest().set(
+        WeightsEntry(
+            url_hash=_hash_url(url),
+            url=url,
+            file_name=weights_path.name,
+            path=str(weights_path),
+            size=get_local_file_content_length(weights_path),
+            sha256=sha256 or (remote_file.sha256 if remote_file else None),
+            etag=remote_file.etag if remote_file else None,
+            last_modified=remote_file.last_modified if remote_file else None,
+            validated=True,
+            external=external,
+        )
+    )
+
+
+def _download_model_weights_fal(
+    url: str, force: bool = False, request_headers: dict[str, str] | None = None
+) -> Path:
+    url_hash = _hash_url(url)
+    weights_dir = Path(FAL_MODEL_WEIGHTS_DIR / url_hash)
+
+    if not force:
+        weights_path = _get_manifest_hit(url_hash)
+        if weights_path is not None:
+            return weights_path
 
+    # Files downloaded before the manifest existed are indexed on first use.
     if weights_dir.exists() and not force:
         try:
             weights_path = next(
                 wp for wp in weights_dir.glob("*") if wp.suffix != TEMP_FILE_SUFFIX
             )
             is_safetensors_file(weights_path)
+            _record_weights(url, weights_path)
             return weights_path
 
         # The model weights directory is empty, so we need to download the weights
         except StopIteration:
             pass
 
+    if get_hf_hub_cache_enabled():
+        hub_file = _parse_huggingface_url(url)
+        if hub_file is not None:
+            weights_path = _download_huggingface_weights(*hub_file, force=force)
+            if weights_path is not None:
+                _record_weights(url, weights_path, external=True)
+                return weights_path
+
     try:
-        file_name, file_content_length = _get_remote_file_properties(
-            url, request_headers=request_headers
-        )
+        remote_file = _get_remote_file_properties(url, request_headers=request_headers)
     except Exception as e:
         print(e)
         raise DownloadError(f"Failed to get remote file properties for {url}")
 
-    target_path = weights_dir / file_name
+    target_path = weights_dir / remote_file.file_name
+
+    # The same content may already be stored for another URL.
+    if not force and _get_blob_hit(remote_file, target_path):
+        _record_weights(url, target_path, remote_file)
+        return target_path
 
     if (
         target_path.exists()
-        and get_local_file_content_length(target_path) == file_content_length
+        and get_local_file_content_length(target_path) == remote_file.content_length
         and not force
     ):
         is_safetensors_file(target_path)
+        _record_weights(url, target_path, remote_file)
         return target_path
 
     # Make sure the parent directory exists
     target_path.parent.mkdir(parents=True, exist_ok=True)
 
+    sha256 = None
+
+    def set_sha256(digest: str):
+        nonlocal sha256
+        sha256 = digest
+
     try:
         download_url_to_file(
             url,
@@ -215,14 +1302,92 @@ def download_model_weights_fal(
             progress=True,
             headers=request_headers,
             file_integrity_check_callback=is_safetensors_file,
+            resume=True,
+            remote_file=remote_file,
+            expected_sha256=remote_file.sha256,
+            sha256_callback=set_sha256,
+            progress_callback=functools.partial(_set_download_progress, url_hash),
         )
     except Exception as e:
         print(e)
         raise DownloadError(f"Failed to download {url}")
 
+    if sha256:
+        _store_blob(target_path, sha256)
+
+    _record_weights(url, target_path, remote_file, sha256)
+
     return target_path
 
 
+def _parse_huggingface_url(url: str) -> tuple[str, str, str, str] | None:
+    """Split a huggingface.co ``resolve`` URL into
+    (repo_type, repo_id, revision, filename)."""
+    parsed_url = urlparse(url)
+    if parsed_url.netloc != "huggingface.co":
+        return None
+
+    match = re.fullmatch(
+        r"/(?:(datasets|spaces)/)?([^/]+(?:/[^/]+)?)/resolve/([^/]+)/(.+)",
+        parsed_url.path,
+    )
+    if not match:
+        return None
+
+    repo_type = {"datasets": "dataset", "spaces": "space"}.get(match[1], "model")
+    return repo_type, match[2], unquote(match[3]), unquote(match[4])
+
+
+def _download_huggingface_weights(
+    repo_type: str, repo_id: str, revision: str, filename: str, force: bool = False
+) -> Path | None:
+    """Resolve weights through the Hugging Face hub cache (``HF_HOME``), so
+    files already fetched by other tools are reused and new downloads are
+    shared with them.
+
+    Returns None when huggingface_hub is not installed.
+    """
+    try:
+        import huggingface_hub
+    except ImportError:
+        return None
+
+    # Offline lookup first: a hit needs no request to the Hub at all.
+    if not force:
+        cached_path = huggingface_hub.try_to_load_from_cache(
+            repo_id, filename, revision=revision, repo_type=repo_type
+        )
+        if isinstance(cached_path, str):
+            try:
+                is_safetensors_file(cached_path)
+                return Path(cached_path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring invalid Hugging Face cache file {cached_path}: {e}")
+                force = True
+
+    try:
+        weights_path = huggingface_hub.hf_hub_download(
+            repo_id,
+            filename,
+            revision=revision,
+            repo_type=repo_type,
+            token=get_hf_token() or None,
+            force_download=force,
+        )
+    except Exception as e:
+        print(e)
+        raise DownloadError(f"Failed to download {filename} from {repo_id}")
+
+    # A file that is still invalid after a fresh download is not retried.
+    try:
+        is_safetensors_file(weights_path)
+    except (OSError, ValueError) as e:
+        print(e)
+        raise DownloadError(f"Invalid weights file {filename} from {repo_id}")
+
+    return Path(weights_path)
+
+
 def _get_filename_from_content_disposition(cd: str | None) -> str | None:
     if not cd:
         return None
@@ -262,47 +1427,213 @@ def _parse_filename(url: str, cd: str | None) -> str:
     return file_name  # type: ignore
 
 
-def _get_remote_file_properties(
-    url: str, request_headers: dict[str, str] = None
-) -> tuple[str, int]:
+_remote_file_properties_lock = threading.Lock()
+_remote_file_properties: dict[str, RemoteFileProperties] = {}
+
+
+def _probe_remote_file(url: str, headers: dict[str, str]):
+    """Fetch the headers of a remote file without transferring its body.
+
+    HEAD is tried first. Servers that reject it (e.g. signed URLs that are
+    only valid for GET) get a GET for the first byte instead.
+    """
+    import requests
+
+    timeout = get_download_settings()["timeout"]
+
+    response = requests.head(
+        url, headers=headers, allow_redirects=True, timeout=timeout
+    )
+    if response.ok or response.status_code == 304:
+        return response
+
+    response = requests.get(
+        url,
+        headers={**headers, "Range": "bytes=0-0"},
+        stream=True,
+        allow_redirects=True,
+        timeout=timeout,
+    )
+    response.close()
+    response.raise_for_status()
+    return response
+
+
+def _get_linked_sha256(response) -> str | None:
+    # Hugging Face sends the SHA-256 of LFS files as X-Linked-Etag on the
+    # redirect from huggingface.co to the CDN.
+    for redirect_response in (*response.history, response):
+        linked_etag = redirect_response.headers.get("X-Linked-Etag", "")
+        sha256 = linked_etag.removeprefix("W/").strip('"').lower()
+        if re.fullmatch("[0-9a-f]{64}", sha256):
+            return sha256
+
+    return None
+
+
+def _get_civitai_sha256(
+    url: str, request_headers: dict[str, str] | None = None
+) -> str | None:
+    from urllib.parse import parse_qs
+
+    parsed_url = urlparse(url)
+    match = re.fullmatch(r"/api/download/models/(\d+)/?", parsed_url.path)
+    if parsed_url.netloc != "civitai.com" or not match:
+        return None
+
     import requests
 
+    try:
+        response = requests.get(
+            f"https://civitai.com/api/v1/model-versions/{match[1]}",
+            headers={**_REQUEST_HEADERS, **(request_headers or {})},
+            timeout=10,
+        )
+        response.raise_for_status()
+        files = response.json().get("files", [])
+    except Exception as e:
+        print(f"Failed to get the Civitai file hashes for {url}: {e}")
+        return None
+
+    # The download URL may select a file with ?type=...&format=...&size=...&fp=...,
+    # otherwise Civitai serves the primary file.
+    query = {key: values[0] for key, values in parse_qs(parsed_url.query).items()}
+    metadata_filters = {key: query[key] for key in ("format", "size", "fp") if key in query}
+
+    matching_files = []
+    for file in files:
+        metadata = file.get("metadata") or {}
+        if "type" in query and file.get("type") != query["type"]:
+            continue
+        if any(metadata.get(key) != value for key, value in metadata_filters.items()):
+            continue
+        if "type" not in query and not metadata_filters and not file.get("primary"):
+            continue
+        matching_files.append(file)
+
+    # A wrong digest would fail a good download, so ambiguous selections are
+    # downloaded without one.
+    if len(matching_files) != 1:
+        return None
+
+    sha256 = (matching_files[0].get("hashes") or {}).get("SHA256")
+    return sha256.lower() if sha256 else None
+
+
+def _get_remote_file_properties(
+    url: str, request_headers: dict[str, str] = None
+) -> RemoteFileProperties:
     headers = {
         **_REQUEST_HEADERS,
         **(request_headers or {}),
     }
 
-    req = requests.get(
-        url, headers=headers, stream=True, allow_redirects=True, verify=False
-    )
-    req.raise_for_status()
+    with _remote_file_properties_lock:
+        cached = _remote_file_properties.get(url)
+
+    if cached is not None and (cached.etag or cached.last_modified):
+        conditional_headers = (
+            {"If-None-Match": cached.etag}
+            if cached.etag
+            else {"If-Modified-Since": cached.last_modified}
+        )
+        response = _probe_remote_file(url, {**headers, **conditional_headers})
+        if response.status_code == 304:
+            return cached._replace(final_url=response.url)
+    else:
+        response = _probe_remote_file(url, headers)
 
-    headers = req.headers  # type: ignore
+    headers = response.headers  # type: ignore
     content_disposition = headers.get("Content-Disposition", None)
     file_name = _parse_filename(url, content_disposition)
-    content_length = int(headers.get("Content-Length", -1))
 
-    return file_name, content_length
+    content_length = -1
+    content_range = headers.get("Content-Range", None)
+    if response.status_code == 206 and content_range:
+        total_size = content_range.rsplit("/", 1)[-1]
+        if total_size.isdigit():
+            content_length = int(total_size)
+    else:
+        content_length = _parse_content_length(headers) or -1
+
+    remote_file = RemoteFileProperties(
+        file_name,
+        content_length,
+        headers.get("ETag"),
+        headers.get("Last-Modified"),
+        final_url=response.url,
+        supports_ranges=response.status_code == 206 or _supports_ranges(headers),
+        sha256=_get_linked_sha256(response)
+        or _get_civitai_sha256(url, request_headers),
+    )
+
+    with _remote_file_properties_lock:
+        _remote_file_properties[url] = remote_file
+
+    return remote_file
+
+
+# Same limit as the safetensors library
+SAFETENSORS_MAX_HEADER_SIZE = 100_000_000
+
+
+def _is_json_int(value) -> bool:
+    # JSON booleans are parsed as bool, which is a subclass of int.
+    return isinstance(value, int) and not isinstance(value, bool)
 
 
 def is_safetensors_file(path: str | Path):
-    from safetensors import safe_open
+    """Validate a .safetensors file by parsing its header directly.
 
+    Only the first bytes of the file are read and no framework is loaded.
+    """
     path = str(path)
 
     if not path.endswith(".safetensors"):
         raise ValueError(f"File {path} is not a .safetensors file")
 
-    try:
-        with safe_open(path, framework="pt"):
-            pass
-    except Exception as e:
-        print(e)
-        error_mesage = e.args[0]
-        if error_mesage == "Error while deserializing header: HeaderTooLarge":
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        header_size_bytes = f.read(8)
+        if len(header_size_bytes) < 8:
             raise ValueError(f"File {path} is not a .safetensors file")
-        else:
-            raise e
+
+        header_size = int.from_bytes(header_size_bytes, "little")
+        if header_size > min(SAFETENSORS_MAX_HEADER_SIZE, file_size - 8):
+            raise ValueError(f"File {path} is not a .safetensors file")
+
+        try:
+            header = json.loads(f.read(header_size))
+        except (UnicodeDecodeError, ValueError):
+            raise ValueError(f"File {path} has an invalid .safetensors header")
+
+    if not isinstance(header, dict):
+        raise ValueError(f"File {path} has an invalid .safetensors header")
+
+    data_size = 0
+    for name, tensor_info in header.items():
+        if name == "__metadata__":
+            continue
+        try:
+            dtype = tensor_info["dtype"]
+            shape = tensor_info["shape"]
+            begin, end = tensor_info["data_offsets"]
+        except (TypeError, KeyError, ValueError):
+            raise ValueError(f"File {path} has an invalid entry for tensor {name}")
+        if (
+            not isinstance(dtype, str)
+            or not isinstance(shape, list)
+            or not all(_is_json_int(dim) for dim in shape)
+            or not _is_json_int(begin)
+            or not _is_json_int(end)
+        ):
+            raise ValueError(f"File {path} has an invalid entry for tensor {name}")
+        if not 0 <= begin <= end:
+            raise ValueError(f"File {path} has invalid offsets for tensor {name}")
+        data_size = max(data_size, end)
+
+    if data_size != file_size - 8 - header_size:
+        raise ValueError(f"File {path} is truncated or has trailing data")
 
 
 @contextmanager
@@ -0,0 +1,117 @@
+import time
+
+import httpx
+
+from .config import get_http_client_settings
+
+_client: httpx.AsyncClient | None = None
+
+_pool_wait_stats = {
+    "requests": 0,
+    "new_connections": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide client used to talk to fal.
+
+    The client is created on first use, so keep-alive connections to the fal
+    endpoint are reused across workflow runs.
+    """
+    global _client
+
+    if _client is None or _client.is_closed:
+        settings = get_http_client_settings()
+
+        http2 = settings["http2"]
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("HTTP/2 requires the 'h2' package, falling back to HTTP/1.1")
+                http2 = False
+
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(
+                connect=settings["connect_timeout"],
+                read=settings["read_timeout"],
+                write=settings["write_timeout"],
+                pool=settings["pool_timeout"],
+            ),
+        )
+
+    return _client
+
+
+async def close_http_client(app=None):
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_trace_extension() -> dict:
+    """Build a request extension that records how long a request waited for a
+    connection from the pool.
+
+    The wait ends when httpcore either starts opening a new connection or starts
+    sending headers on a reused one.
+    """
+    started_at = time.perf_counter()
+    waiting = True
+
+    async def trace(event_name: str, info: dict):
+        nonlocal waiting
+
+        if not waiting:
+            return
+
+        if event_name == "connection.connect_tcp.started":
+            _pool_wait_stats["new_connections"] += 1
+        elif not event_name.endswith("send_request_headers.started"):
+            return
+
+        waiting = False
+        wait_seconds = time.perf_counter() - started_at
+        _pool_wait_stats["requests"] += 1
+        _pool_wait_stats["total_wait_seconds"] += wait_seconds
+        _pool_wait_stats["max_wait_seconds"] = max(
+            _pool_wait_stats["max_wait_seconds"], wait_seconds
+        )
+
+    return {"trace": trace}
+
+
+def get_http_client_stats() -> dict:
+    stats = {
+        "active_connections": 0,
+        "idle_connections": 0,
+        **_pool_wait_stats,
+    }
+
+    requests = _pool_wait_stats["requests"]
+    stats["average_wait_seconds"] = (
+        _pool_wait_stats["total_wait_seconds"] / requests if requests else 0.0
+    )
+
+    if _client is None or _client.is_closed:
+        return stats
+
+    # httpx does not expose pool state publicly, read it from the httpcore pool.
+    pool = getattr(_client._transport, "_pool", None)
+    for connection in getattr(pool, "connections", []):
+        if connection.is_idle():
+            stats["idle_connections"] += 1
+        else:
+            stats["active_connections"] += 1
+
+    return stats
@@ -0,0 +1,197 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import NamedTuple
+
+from .config import (
+    get_cache_dir,
+    get_image_cache_settings,
+    get_image_max_download_size,
+)
+from .download_utils import download_url_to_bytes
+
+IMAGE_CACHE_FILE_NAME = "images.sqlite"
+IMAGE_CACHE_DIR_NAME = "images"
+
+# Images that were not used for this long are removed from disk.
+_MAX_ENTRY_AGE = 7 * 24 * 3600
+
+
+class ImageCacheEntry(NamedTuple):
+    url: str
+    sha256: str
+    size: int
+    etag: str | None
+    last_modified: str | None
+    checked_at: float
+
+
+_COLUMNS = ", ".join(ImageCacheEntry._fields)
+
+
+class ImageCache:
+    """Raw bytes of images loaded from URLs.
+
+    An entry is fresh for ``ttl`` seconds after it was last checked. After that
+    it is revalidated with a conditional request, so an unchanged image is never
+    downloaded twice. Bytes are stored by content hash, which lets callers cache
+    decoded images by content as well.
+    """
+
+    def __init__(self, cache_dir: Path, ttl: float):
+        self.cache_dir = Path(cache_dir)
+        self.db_path = self.cache_dir / IMAGE_CACHE_FILE_NAME
+        self.images_dir = self.cache_dir / IMAGE_CACHE_DIR_NAME
+        self.ttl = ttl
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._init_lock:
+            if not self._initialized:
+                self.images_dir.mkdir(parents=True, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+        with self._init_lock:
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS images ("
+                    "url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, etag TEXT, last_modified TEXT, "
+                    "checked_at REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS stats ("
+                    "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                self._initialized = True
+
+        return connection
+
+    def _increment(self, connection: sqlite3.Connection, **counters: int):
+        connection.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            counters.items(),
+        )
+
+    def get_path(self, sha256: str) -> Path:
+        return self.images_dir / sha256
+
+    def fetch(self, url: str) -> tuple[ImageCacheEntry, bytes | None]:
+        """Return the cache entry of ``url``, downloading or revalidating the
+        image as needed.
+
+        Freshly downloaded bytes are returned as well, so they can be decoded
+        without reading them back from disk.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT {_COLUMNS} FROM images WHERE url = ?", (url,)
+            ).fetchone()
+
+        entry = ImageCacheEntry(*row) if row is not None else None
+        if entry is not None and not self.get_path(entry.sha256).exists():
+            entry = None
+
+        if entry is not None and time.time() - entry.checked_at < self.ttl:
+            with closing(self._connect()) as connection:
+                self._increment(connection, hits=1)
+            return entry, None
+
+        content = download_url_to_bytes(
+            url,
+            etag=entry.etag if entry else None,
+            last_modified=entry.last_modified if entry else None,
+            max_size=get_image_max_download_size(),
+        )
+
+        if content is None:
+            entry = entry._replace(checked_at=time.time())
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "UPDATE images SET checked_at = ? WHERE url = ?",
+                    (entry.checked_at, url),
+                )
+                self._increment(connection, revalidations=1)
+            return entry, None
+
+        return self._store(url, content), content.data
+
+    def _store(self, url: str, content) -> ImageCacheEntry:
+        entry = ImageCacheEntry(
+            url,
+            hashlib.sha256(content.data).hexdigest(),
+            len(content.data),
+            content.etag,
+            content.last_modified,
+            time.time(),
+        )
+
+        image_path = self.get_path(entry.sha256)
+        if not image_path.exists():
+            temp_path = image_path.with_name(f"{entry.sha256}.{os.getpid()}.tmp")
+            temp_path.write_bytes(content.data)
+            os.replace(temp_path, image_path)
+
+        with closing(self._connect()) as connection:
+            # Bytes the URL served before, if its content changed.
+            replaced_hashes = {
+                row[0]
+                for row in connection.execute(
+                    "SELECT sha256 FROM images WHERE url = ?", (url,)
+                )
+            }
+            connection.execute(
+                f"INSERT OR REPLACE INTO images ({_COLUMNS}) "
+                f"VALUES ({', '.join('?' * len(ImageCacheEntry._fields))})",
+                entry,
+            )
+            self._increment(connection, misses=1, bytes_downloaded=entry.size)
+            self._prune(connection, entry.checked_at - _MAX_ENTRY_AGE, replaced_hashes)
+
+        return entry
+
+    def _prune(
+        self,
+        connection: sqlite3.Connection,
+        checked_before: float,
+        unused_hashes: set[str],
+    ):
+        unused_hashes |= {
+            row[0]
+            for row in connection.execute(
+                "SELECT sha256 FROM images WHERE checked_at < ?", (checked_before,)
+            )
+        }
+        connection.execute("DELETE FROM images WHERE checked_at < ?", (checked_before,))
+
+        # Other URLs may still serve the same bytes.
+        for sha256 in unused_hashes:
+            in_use = connection.execute(
+                "SELECT 1 FROM images WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if not in_use:
+                self.get_path(sha256).unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, int]:
+        with closing(self._connect()) as connection:
+            stats = {"hits": 0, "revalidations": 0, "misses": 0, "bytes_downloaded": 0}
+            stats.update(connection.execute("SELECT name, value FROM stats"))
+            stats["entries"], stats["size"] = connection.execute(
+                "SELECT COUNT(*), (SELECT COALESCE(SUM(size), 0) FROM "
+                "(SELECT DISTINCT sha256, size FROM images)) FROM images"
+            ).fetchone()
+            return stats
+
+
+@functools.cache
+def get_image_cache() -> ImageCache:
+    return ImageCache(get_cache_dir(), get_image_cache_settings()["ttl"])
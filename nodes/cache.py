@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable
+
+_caches: dict[str, "LRUCache"] = {}
+
+
+def get_cache_stats() -> dict[str, dict]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def get_file_identity(path: str) -> tuple[str, int, int, int]:
+    """Key that changes whenever the file at ``path`` is replaced or modified."""
+    file_stat = os.stat(path)
+    return (path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+
+
+def get_tensors_size(value: Any) -> int:
+    """Number of bytes held by the tensors in a (nested) container."""
+    # Memory-mapped state dicts are charged for the whole mapping without
+    # materialising their tensors.
+    if isinstance(value, Mapping) and hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(get_tensors_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(get_tensors_size(v) for v in value)
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    return 0
+
+
+class LRUCache:
+    """Process-wide least recently used cache bounded by a byte budget.
+
+    Every instance registers itself by name, so hit rates and resident bytes of
+    all caches can be reported together.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        get_size: Callable[[Any], int] = get_tensors_size,
+    ):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Any, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        _caches[name] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.get_size(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.resident_bytes -= self._entries.pop(key)[1]
+
+            # Values larger than the whole budget are not cached at all.
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.resident_bytes += size
+
+            while self.resident_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
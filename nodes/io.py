@@ -3,12 +3,31 @@ import string
 import os
 import json
 import random
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
 from PIL import Image, ImageOps, ImageSequence
 from PIL.PngImagePlugin import PngInfo
 from comfy.cli_args import args
 import folder_paths
-from ..download_utils import download_file_temp
+from ..config import get_image_cache_settings, get_image_max_download_size
+from ..download_utils import decode_data_url
+from ..image_cache import get_image_cache
+from .cache import LRUCache
+
+# Decoded (IMAGE, MASK) pairs keyed by image content and return mode. The raw
+# bytes are cached on disk by URL, see image_cache.py.
+decoded_image_cache = LRUCache("image", get_image_cache_settings()["memory_size"])
+
+
+@functools.cache
+def _get_encode_executor() -> ThreadPoolExecutor:
+    # PIL releases the GIL while compressing, so images encode in parallel.
+    return ThreadPoolExecutor(
+        max_workers=os.cpu_count() or 1, thread_name_prefix="fal-encode"
+    )
 
 
 class IntegerInput:
@@ -85,6 +104,42 @@ class StringInput:
         return (value,)
 
 
+# File extension of every SaveImage output format.
+SAVE_IMAGE_FORMATS = {
+    "png": "png",
+    "webp_lossless": "webp",
+    "webp": "webp",
+    "jpeg": "jpg",
+    "npy": "npy",
+}
+
+# JPEG keeps EXIF data in a single APP1 segment, which is limited to 64 KB.
+JPEG_MAX_EXIF_SIZE = 65533
+
+
+def _get_png_metadata(prompt, extra_pnginfo) -> PngInfo:
+    metadata = PngInfo()
+    if prompt is not None:
+        metadata.add_text("prompt", json.dumps(prompt))
+    if extra_pnginfo is not None:
+        for x in extra_pnginfo:
+            metadata.add_text(x, json.dumps(extra_pnginfo[x]))
+    return metadata
+
+
+def _get_exif_metadata(prompt, extra_pnginfo) -> bytes:
+    # Same tags as ComfyUI's own WebP saver, so its loader can read them back.
+    exif = Image.Exif()
+    if prompt is not None:
+        exif[0x0110] = "prompt:{}".format(json.dumps(prompt))
+    if extra_pnginfo is not None:
+        tag = 0x010F
+        for x in extra_pnginfo:
+            exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+            tag -= 1
+    return exif.tobytes()
+
+
 class SaveImage:
     def __init__(self):
         self.output_dir = folder_paths.get_output_directory()
@@ -103,6 +158,11 @@ class SaveImage:
                     {"default": "output_input"},
                 ),
             },
+            "optional": {
+                "format": (list(SAVE_IMAGE_FORMATS), {"default": "png"}),
+                "quality": ("INT", {"default": 90, "min": 1, "max": 100}),
+                "compress_level": ("INT", {"default": 4, "min": 0, "max": 9}),
+            },
             "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"},
         }
 
@@ -114,13 +174,25 @@ class SaveImage:
     CATEGORY = "image"
 
     def save_images(
-        self, images, output_name, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None
+        self,
+        images,
+        output_name,
+        filename_prefix="ComfyUI",
+        format="png",
+        quality=90,
+        compress_level=None,
+        prompt=None,
+        extra_pnginfo=None,
     ):
         import numpy as np
+        import torch
 
         if not output_name:
             raise ValueError("Output name is required")
 
+        if format not in SAVE_IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {format}")
+
         filename_prefix += self.prefix_append
         (
             full_output_folder,
@@ -131,32 +203,83 @@ class SaveImage:
         ) = folder_paths.get_save_image_path(
             filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0]
         )
-        results = list()
-        for batch_number, image in enumerate(images):
-            i = 255.0 * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
 
+        # Metadata and encoder options are the same for every image in the
+        # batch.
+        save_options = self.get_save_options(
+            format,
+            quality,
+            self.compress_level if compress_level is None else compress_level,
+            prompt,
+            extra_pnginfo,
+        )
+
+        if format == "npy":
+            # Raw float32 tensors for pipelines that load the outputs again.
+            batch = images.cpu().numpy()
+        else:
+            # Converting on the device first also shrinks the copy to the CPU.
+            batch = images.mul(255.0).clamp_(0, 255).to(torch.uint8).cpu().numpy()
+
+        extension = SAVE_IMAGE_FORMATS[format]
+        files = []
+        for batch_number in range(len(batch)):
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(
-                os.path.join(full_output_folder, file),
-                pnginfo=metadata,
-                compress_level=self.compress_level,
-            )
-            results.append(
-                {"filename": file, "subfolder": subfolder, "type": self.type}
-            )
+            files.append(f"{filename_with_batch_num}_{counter:05}_.{extension}")
             counter += 1
 
+        def save_image(pixels, file):
+            file_path = os.path.join(full_output_folder, file)
+            if format == "npy":
+                np.save(file_path, pixels)
+            else:
+                Image.fromarray(pixels).save(file_path, **save_options)
+
+        # Consuming the results re-raises the first failed save.
+        list(_get_encode_executor().map(save_image, batch, files))
+
+        results = [
+            {"filename": file, "subfolder": subfolder, "type": self.type}
+            for file in files
+        ]
+
         return {"ui": {"images": results}}
+
+    def get_save_options(self, format, quality, compress_level, prompt, extra_pnginfo):
+        embed_metadata = not args.disable_metadata and (
+            prompt is not None or extra_pnginfo is not None
+        )
+
+        if format == "png":
+            options = {"format": "PNG", "compress_level": compress_level}
+            if embed_metadata:
+                options["pnginfo"] = _get_png_metadata(prompt, extra_pnginfo)
+            return options
+
+        if format == "npy":
+            return {}
+
+        if format == "jpeg":
+            options = {"format": "JPEG", "quality": quality}
+        else:
+            # For lossless WebP, quality trades encoding speed for file size.
+            options = {
+                "format": "WEBP",
+                "quality": quality,
+                "lossless": format == "webp_lossless",
+            }
+
+        if embed_metadata:
+            exif = _get_exif_metadata(prompt, extra_pnginfo)
+            if format == "jpeg" and len(exif) > JPEG_MAX_EXIF_SIZE:
+                print(
+                    f"Workflow metadata is {len(exif)} bytes, too large for JPEG "
+                    "EXIF; saving without metadata"
+                )
+            else:
+                options["exif"] = exif
+
+        return options
     
 
 # Based on https://github.com/comfyanonymous/ComfyUI/blob/04e8798c37d958d74ea6bda506b86f51356d6caf/nodes.py#L1471-L1526
@@ -185,15 +308,44 @@ class LoadImageFromURL:
     FUNCTION = "load_image"
 
     def load_image(self, url: str, return_image_mode: str = "RGB"):
+        data = None
+        # data: URLs carry their content, so hashing them is enough.
+        if url.startswith("data:"):
+            content_hash = hashlib.sha256(url.encode()).hexdigest()
+        else:
+            entry, data = get_image_cache().fetch(url)
+            content_hash = entry.sha256
+
+        cache_key = (content_hash, return_image_mode)
+        output = decoded_image_cache.get(cache_key)
+        if output is not None:
+            return output
+
+        # Images are decoded straight from memory when their bytes are at
+        # hand, and from the disk cache otherwise.
+        if url.startswith("data:"):
+            data = decode_data_url(url, get_image_max_download_size())
+
+        image_file = (
+            BytesIO(data) if data is not None else get_image_cache().get_path(content_hash)
+        )
+        with Image.open(image_file) as img:
+            output = self.decode_image(img, return_image_mode)
+
+        decoded_image_cache.set(cache_key, output)
+        return output
+
+    def decode_image(self, img: Image.Image, return_image_mode: str):
         import numpy as np
         import torch
 
-        with download_file_temp(url) as image_path:
-            img = Image.open(image_path)
+        # Frames are written into tensors sized for the whole sequence, so
+        # animations are not concatenated from per-frame copies.
+        frame_count = getattr(img, "n_frames", 1)
+        output_image = None
+        output_mask = None
 
-        output_images = []
-        output_masks = []
-        for i in ImageSequence.Iterator(img):
+        for index, i in enumerate(ImageSequence.Iterator(img)):
             i = ImageOps.exif_transpose(i)
 
             if i.mode == 'I':
@@ -205,28 +357,34 @@ class LoadImageFromURL:
                 image = self.convert_pil_rgb_to_bgr(i, return_image_mode)
             else:
                 image = i.convert(return_image_mode)
-            
-            print("Old image mode: ", i.mode)
-            print("New image mode: ", return_image_mode)
 
-            image = np.array(image).astype(np.float32) / 255.0
-            image = torch.from_numpy(image)[None,]
+            pixels = torch.from_numpy(np.array(image))
+            if output_image is None:
+                output_image = torch.empty(
+                    (frame_count, *pixels.shape), dtype=torch.float32
+                )
+            output_image[index].copy_(pixels)
 
             if 'A' in i.getbands():
-                mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
-                mask = 1. - torch.from_numpy(mask)
-            else:
-                mask = torch.zeros((64,64), dtype=torch.float32, device="cpu")
-
-            output_images.append(image)
-            output_masks.append(mask.unsqueeze(0))
-
-        if len(output_images) > 1:
-            output_image = torch.cat(output_images, dim=0)
-            output_mask = torch.cat(output_masks, dim=0)
+                alpha = torch.from_numpy(np.array(i.getchannel('A')))
+                if output_mask is None:
+                    output_mask = torch.zeros(
+                        (frame_count, *alpha.shape), dtype=torch.float32
+                    )
+                output_mask[index].copy_(alpha).mul_(-1 / 255.0).add_(1.0)
+
+        # n_frames is only an upper bound for some files, frames that were
+        # never decoded must not be returned.
+        frame_count = index + 1
+        output_image = output_image[:frame_count]
+
+        # Pixel values are scaled to [0, 1] once, for all frames at a time.
+        output_image.div_(255.0)
+
+        if output_mask is None:
+            output_mask = torch.zeros((frame_count, 64, 64), dtype=torch.float32)
         else:
-            output_image = output_images[0]
-            output_mask = output_masks[0]
+            output_mask = output_mask[:frame_count]
 
         return (output_image, output_mask)
 
@@ -1,12 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import folder_paths
 
-from ..download_utils import download_model_weights
+from ..config import (
+    get_checkpoint_cache_size,
+    get_download_max_workers,
+    get_lora_cache_size,
+    get_lora_mmap,
+)
+from ..download_utils import download_model_weights, pinned_weights
+from .cache import LRUCache, get_file_identity
+from .mmap_safetensors import MappedSafetensors
 
+# Shared by every LoRA loader instance, so stacked or alternating LoRAs are
+# only read from disk once.
+lora_cache = LRUCache("lora", get_lora_cache_size())
 
-class RemoteLoraLoader:
-    def __init__(self):
-        self.loaded_lora = None
+# Loaded (MODEL, CLIP, VAE) triples. Checkpoints are too large to size
+# precisely, so this cache is bounded by entry count: every entry weighs one.
+checkpoint_cache = LRUCache(
+    "checkpoint", get_checkpoint_cache_size(), get_size=lambda _: 1
+)
+
+
+def load_lora_file(lora_path: str):
+    """Load a LoRA state dict through the shared LoRA cache."""
+    import comfy.utils
+
+    lora_key = get_file_identity(lora_path)
+
+    lora = lora_cache.get(lora_key)
+    if lora is None:
+        if get_lora_mmap():
+            lora = MappedSafetensors(lora_path)
+        else:
+            lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+        lora_cache.set(lora_key, lora)
+    return lora
+
+
+def parse_lora_stack(loras: str) -> list[tuple[str, float, float]]:
+    """Parse ``url[, strength_model[, strength_clip]]`` lines.
+
+    Blank lines and lines starting with ``#`` are skipped. A missing
+    strength_model defaults to 1.0 and a missing strength_clip to
+    strength_model.
+    """
+    lora_stack = []
+
+    for line_number, line in enumerate(loras.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) > 3:
+            raise ValueError(f"Too many fields on LoRA stack line {line_number}")
+
+        try:
+            strengths = [float(field) for field in fields[1:]]
+        except ValueError:
+            raise ValueError(f"Invalid strength on LoRA stack line {line_number}")
+
+        strength_model = strengths[0] if strengths else 1.0
+        strength_clip = strengths[1] if len(strengths) > 1 else strength_model
+        lora_stack.append((fields[0], strength_model, strength_clip))
+
+    return lora_stack
+
+
+def apply_lora_stack(model, clip, loras: list[tuple[dict, float, float]]):
+    """Patch ``model`` and ``clip`` with several LoRAs, in order.
 
+    Each LoRA goes through ``comfy.sd.load_lora_for_models``, so a missing
+    model or CLIP and unmatched LoRA keys are handled exactly as with chained
+    loader nodes.
+    """
+    import comfy.sd
+
+    for lora, strength_model, strength_clip in loras:
+        model, clip = comfy.sd.load_lora_for_models(
+            model, clip, lora, strength_model, strength_clip
+        )
+
+    return (model, clip)
+
+
+class RemoteLoraLoader:
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -37,25 +118,12 @@ class RemoteLoraLoader:
 
     def load_lora(self, model, clip, lora_url, strength_model, strength_clip):
         import comfy.sd
-        import comfy.utils
 
         if strength_model == 0 and strength_clip == 0:
             return (model, clip)
 
-        lora_path = str(download_model_weights(lora_url))
-
-        lora = None
-        if self.loaded_lora is not None:
-            if self.loaded_lora[0] == lora_path:
-                lora = self.loaded_lora[1]
-            else:
-                temp = self.loaded_lora
-                self.loaded_lora = None
-                del temp
-
-        if lora is None:
-            lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-            self.loaded_lora = (lora_path, lora)
+        with pinned_weights(lora_url):
+            lora = load_lora_file(str(download_model_weights(lora_url)))
 
         model_lora, clip_lora = comfy.sd.load_lora_for_models(
             model, clip, lora, strength_model, strength_clip
@@ -63,6 +131,54 @@ class RemoteLoraLoader:
         return (model_lora, clip_lora)
 
 
+class RemoteLoraStackLoader:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "clip": ("CLIP",),
+                "loras": (
+                    "STRING",
+                    {
+                        "multiline": True,
+                        "default": "https://huggingface.co/nerijs/pixel-art-xl/resolve/main/pixel-art-xl.safetensors, 1.0, 1.0",
+                    },
+                ),
+            }
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP")
+    FUNCTION = "load_loras"
+
+    CATEGORY = "loaders"
+
+    def load_loras(self, model, clip, loras):
+        lora_stack = [
+            (url, strength_model, strength_clip)
+            for url, strength_model, strength_clip in parse_lora_stack(loras)
+            if strength_model != 0 or strength_clip != 0
+        ]
+        if not lora_stack:
+            return (model, clip)
+
+        lora_urls = [url for url, _, _ in lora_stack]
+
+        with pinned_weights(*lora_urls):
+            max_workers = min(len(lora_urls), get_download_max_workers())
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                lora_paths = list(executor.map(download_model_weights, lora_urls))
+
+            loaded_loras = [
+                (load_lora_file(str(lora_path)), strength_model, strength_clip)
+                for lora_path, (_, strength_model, strength_clip) in zip(
+                    lora_paths, lora_stack
+                )
+            ]
+
+        return apply_lora_stack(model, clip, loaded_loras)
+
+
 class RemoteCheckpointLoader:
     @classmethod
     def INPUT_TYPES(s):
@@ -74,7 +190,11 @@ class RemoteCheckpointLoader:
                         "default": "https://huggingface.co/nerijs/pixel-art-xl/resolve/main/pixel-art-xl.safetensors"
                     },
                 ),
-            }
+            },
+            "optional": {
+                "output_vae": ("BOOLEAN", {"default": True}),
+                "output_clip": ("BOOLEAN", {"default": True}),
+            },
         }
 
     RETURN_TYPES = ("MODEL", "CLIP", "VAE")
@@ -85,22 +205,69 @@ class RemoteCheckpointLoader:
     def load_checkpoint(self, ckpt_url, output_vae=True, output_clip=True):
         import comfy.sd
 
-        ckpt_path = str(download_model_weights(ckpt_url))
-        out = comfy.sd.load_checkpoint_guess_config(
-            ckpt_path,
-            output_vae=True,
-            output_clip=True,
-            embedding_directory=folder_paths.get_folder_paths("embeddings"),
-        )
-        return out[:3]
+        with pinned_weights(ckpt_url):
+            ckpt_path = os.path.realpath(download_model_weights(ckpt_url))
+            ckpt_key = (get_file_identity(ckpt_path), output_vae, output_clip)
+
+            out = checkpoint_cache.get(ckpt_key)
+            if out is None:
+                out = comfy.sd.load_checkpoint_guess_config(
+                    ckpt_path,
+                    output_vae=output_vae,
+                    output_clip=output_clip,
+                    embedding_directory=folder_paths.get_folder_paths("embeddings"),
+                )[:3]
+                checkpoint_cache.set(ckpt_key, out)
+        return out
+
+
+# Inputs holding weight URLs per loader node, with their download priority.
+# Checkpoints are needed first, so they are fetched before LoRAs.
+REMOTE_WEIGHTS_INPUTS = {
+    "RemoteCheckpointLoader_fal": (0, "ckpt_url"),
+    "RemoteLoraLoader_fal": (1, "lora_url"),
+    "RemoteLoraStackLoader_fal": (1, "loras"),
+}
+
+
+def get_remote_weights(api_workflow: dict) -> list[tuple[int, str]]:
+    """Collect (priority, url) pairs of the weights an API workflow will load."""
+    remote_weights = []
+
+    for node_data in api_workflow.values():
+        class_type = node_data.get("class_type")
+        if class_type not in REMOTE_WEIGHTS_INPUTS:
+            continue
+
+        priority, input_name = REMOTE_WEIGHTS_INPUTS[class_type]
+        value = node_data.get("inputs", {}).get(input_name)
+
+        # Inputs linked to other nodes are only known at execution time.
+        if not isinstance(value, str):
+            continue
+
+        if class_type == "RemoteLoraStackLoader_fal":
+            try:
+                urls = [url for url, _, _ in parse_lora_stack(value)]
+            except ValueError:
+                # Reported when the node executes.
+                continue
+        else:
+            urls = [value.strip()]
+
+        remote_weights.extend((priority, url) for url in urls if url)
+
+    return remote_weights
 
 
 NODE_CLASS_MAPPINGS = {
     "RemoteLoraLoader_fal": RemoteLoraLoader,
+    "RemoteLoraStackLoader_fal": RemoteLoraStackLoader,
     "RemoteCheckpointLoader_fal": RemoteCheckpointLoader,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "RemoteLoraLoader_fal": "Load LoRA from URL (fal)",
+    "RemoteLoraStackLoader_fal": "Load LoRA Stack from URLs (fal)",
     "RemoteCheckpointLoader_fal": "Load Checkpoint from URL (fal)",
 }
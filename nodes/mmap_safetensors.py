@@ -0,0 +1,88 @@
+import json
+import math
+import mmap
+from collections.abc import Mapping
+
+_SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U64": "uint64",
+    "U32": "uint32",
+    "U16": "uint16",
+    "U8": "uint8",
+    "BOOL": "bool",
+    "F8_E4M3": "float8_e4m3fn",
+    "F8_E5M2": "float8_e5m2",
+}
+
+
+class MappedSafetensors(Mapping):
+    """Read-only state dict backed by a memory-mapped .safetensors file.
+
+    Tensors are views over the mapping and are only built when accessed. The
+    mapping is copy-on-write, so processes loading the same file share its
+    page cache pages instead of each holding a private copy.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        header_size = int.from_bytes(self._mmap[:8], "little")
+        header = json.loads(self._mmap[8 : 8 + header_size])
+
+        self.path = path
+        self.nbytes = len(self._mmap)
+        self.metadata = header.pop("__metadata__", None)
+        self._header = header
+        self._data_offset = 8 + header_size
+        self._tensors = {}
+
+    def __getitem__(self, key):
+        tensor = self._tensors.get(key)
+        if tensor is None:
+            tensor = self._tensors[key] = self._load_tensor(self._header[key])
+        return tensor
+
+    def __contains__(self, key):
+        return key in self._header
+
+    def __iter__(self):
+        return iter(self._header)
+
+    def __len__(self):
+        return len(self._header)
+
+    def _load_tensor(self, tensor_info: dict):
+        import torch
+
+        dtype_name = _SAFETENSORS_DTYPES[tensor_info["dtype"]]
+        dtype = getattr(torch, dtype_name, None)
+        if dtype is None:
+            # e.g. unsigned 16/32/64-bit integers need torch 2.3 or newer.
+            raise ValueError(f"{self.path}: this torch version has no {dtype_name}")
+
+        shape = tensor_info["shape"]
+        begin, end = tensor_info["data_offsets"]
+
+        if begin == end:
+            return torch.empty(shape, dtype=dtype)
+
+        offset = self._data_offset + begin
+        if offset % torch.empty((), dtype=dtype).element_size():
+            # Views must be aligned to the element size, copy unaligned data.
+            buffer = bytearray(self._mmap[offset : self._data_offset + end])
+            return torch.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+        return torch.frombuffer(
+            self._mmap,
+            dtype=dtype,
+            count=math.prod(shape),
+            offset=offset,
+        ).reshape(shape)
@@ -0,0 +1,164 @@
+import functools
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .config import get_prefetch_concurrency
+from .download_utils import (
+    download_model_weights,
+    get_download_progress,
+    get_local_file_content_length,
+)
+from .nodes.loader import get_remote_weights
+
+# Finished jobs are kept around for status queries, up to this many.
+MAX_PREFETCH_JOBS = 100
+
+
+class PrefetchItem:
+    def __init__(self, url: str):
+        self.url = url
+        self.status = "queued"
+        self.error: str | None = None
+        self.path: str | None = None
+        self.bytes_done = 0
+        self.total_bytes: int | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def to_dict(self) -> dict:
+        if self.status == "downloading":
+            progress = get_download_progress(self.url)
+            if progress is not None:
+                self.bytes_done, self.total_bytes = progress
+
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+
+        throughput = self.bytes_done / elapsed if elapsed else None
+
+        eta = None
+        if self.status == "downloading" and throughput and self.total_bytes:
+            eta = max(self.total_bytes - self.bytes_done, 0) / throughput
+
+        return {
+            "url": self.url,
+            "status": self.status,
+            "path": self.path,
+            "error": self.error,
+            "bytes_done": self.bytes_done,
+            "total_bytes": self.total_bytes,
+            "throughput": throughput,
+            "eta": eta,
+        }
+
+
+class WeightsPrefetcher:
+    """Downloads model weights in the background before the loaders need them.
+
+    URLs are downloaded in priority order (lower first) by a fixed number of
+    worker threads. A loader that runs while its URL is still downloading joins
+    the in-flight download instead of starting another one.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending: set[str] = set()
+        self._jobs: OrderedDict[str, list[PrefetchItem]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+
+    def _start_workers(self):
+        while len(self._workers) < self.concurrency:
+            worker = threading.Thread(
+                target=self._run,
+                name=f"fal-prefetch-{len(self._workers)}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, url: str, priority: int = 0) -> bool:
+        with self._lock:
+            if url in self._pending:
+                return False
+
+            self._pending.add(url)
+            self._start_workers()
+
+        self._queue.put((priority, next(self._counter), url, None))
+        return True
+
+    def submit_job(self, urls: list[tuple[int, str]]) -> str:
+        """Queue a list of (priority, url) pairs whose progress can be queried
+        with ``get_job``."""
+        job_id = uuid.uuid4().hex
+        items = [PrefetchItem(url) for _, url in urls]
+
+        with self._lock:
+            self._jobs[job_id] = items
+            while len(self._jobs) > MAX_PREFETCH_JOBS:
+                self._jobs.popitem(last=False)
+            self._start_workers()
+
+        for (priority, url), item in zip(urls, items):
+            self._queue.put((priority, next(self._counter), url, item))
+
+        return job_id
+
+    def get_job(self, job_id: str) -> list[dict] | None:
+        with self._lock:
+            items = self._jobs.get(job_id)
+
+        if items is None:
+            return None
+
+        return [item.to_dict() for item in items]
+
+    def _run(self):
+        while True:
+            _, _, url, item = self._queue.get()
+
+            if item is not None:
+                item.status = "downloading"
+                item.started_at = time.time()
+
+            try:
+                weights_path = download_model_weights(url)
+                if item is not None:
+                    item.path = str(weights_path)
+                    item.bytes_done = item.total_bytes = get_local_file_content_length(
+                        weights_path
+                    )
+                    item.status = "done"
+            except Exception as e:
+                print(f"Failed to prefetch {url}: {e}")
+                if item is not None:
+                    item.error = str(e)
+                    item.status = "failed"
+            finally:
+                if item is not None:
+                    item.finished_at = time.time()
+                with self._lock:
+                    self._pending.discard(url)
+                self._queue.task_done()
+
+
+@functools.cache
+def get_weights_prefetcher() -> WeightsPrefetcher:
+    return WeightsPrefetcher(get_prefetch_concurrency())
+
+
+def prefetch_workflow_weights(api_workflow: dict) -> list[str]:
+    prefetcher = get_weights_prefetcher()
+    return [
+        url
+        for priority, url in get_remote_weights(api_workflow)
+        if prefetcher.submit(url, priority)
+    ]
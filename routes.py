@@ -1,5 +1,7 @@
+import asyncio
 import functools
 import json
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
 from pathlib import Path
 from typing import Any
@@ -10,8 +12,28 @@ from aiohttp import web
 from httpx_sse import SSEError, aconnect_sse
 from server import PromptServer
 
-from .config import get_fal_endpoint, get_headers
+from .config import (
+    get_fal_endpoint,
+    get_headers,
+    get_upload_concurrency,
+)
+from .download_utils import (
+    get_download_stats,
+    get_weights_usage,
+    trim_model_weights,
+)
+from .http_client import (
+    close_http_client,
+    get_http_client,
+    get_http_client_stats,
+    get_trace_extension,
+)
+from .image_cache import get_image_cache
+from .nodes.cache import get_cache_stats
 from .nodes.io import FAL_INPUT_NODES
+from .nodes.loader import get_remote_weights
+from .prefetch import get_weights_prefetcher, prefetch_workflow_weights
+from .upload_cache import get_upload_cache
 
 
 class ComfyClientError(Exception):
@@ -36,24 +58,81 @@ async def get_comfy_error_response(
     }
 
 
-@functools.lru_cache(maxsize=128)
 def _upload_file(file_path: Path, md5_hash: str):
-    return fal_client.upload_file(file_path)
+    upload_cache = get_upload_cache()
+    file_size = file_path.stat().st_size
 
+    fal_file_url = upload_cache.get(md5_hash, file_size)
+    if fal_file_url is None:
+        # fal_client uploads files over 100 MB in parallel parts on its own.
+        fal_file_url = fal_client.upload_file(file_path)
+        upload_cache.set(md5_hash, fal_file_url, file_size)
 
-def _calculate_file_hash(file_path: Path):
+    return fal_file_url
+
+
+def _calculate_file_hash(file_path: Path, chunk_size: int = 1024 * 1024):
     import hashlib
 
+    file_hash = hashlib.md5()
     with open(file_path, "rb") as f:
-        file_hash = hashlib.md5(f.read()).hexdigest()
+        while chunk := f.read(chunk_size):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_file_hash(file_path: Path):
+    upload_cache = get_upload_cache()
+
+    file_stat = file_path.stat()
+    file_key = (
+        str(file_path.resolve()),
+        file_stat.st_size,
+        file_stat.st_mtime_ns,
+        file_stat.st_ino,
+    )
+
+    file_hash = upload_cache.get_file_hash(file_key)
+    if file_hash is None:
+        file_hash = _calculate_file_hash(file_path)
+        upload_cache.set_file_hash(file_key, file_hash)
+
     return file_hash
 
 
 def upload_file(file_path: Path):
-    file_hash = _calculate_file_hash(file_path)
+    file_hash = get_file_hash(file_path)
     return _upload_file(file_path, file_hash)
 
 
+@functools.cache
+def _get_upload_executor():
+    return ThreadPoolExecutor(
+        max_workers=get_upload_concurrency(), thread_name_prefix="fal-upload"
+    )
+
+
+# Uploads running right now, by resolved file path
+_inflight_uploads: dict[Path, asyncio.Future] = {}
+
+
+async def upload_file_async(file_path: Path):
+    # Hashing and uploading are blocking, keep them off the event loop so the
+    # server stays responsive while large inputs are being uploaded.
+    file_key = file_path.resolve()
+
+    # A file referenced by several inputs or requests is uploaded once.
+    future = _inflight_uploads.get(file_key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_upload_executor(), upload_file, file_path)
+        _inflight_uploads[file_key] = future
+        future.add_done_callback(lambda _: _inflight_uploads.pop(file_key, None))
+
+    # Shielded, so a cancelled caller does not cancel the upload for the others.
+    return await asyncio.shield(future)
+
+
 async def upload_file_load_image(node_id, node_data, dry_run=False):
     import folder_paths
 
@@ -62,7 +141,7 @@ async def upload_file_load_image(node_id, node_data, dry_run=False):
         fal_file_url = image
     else:
         image_path = Path(folder_paths.get_annotated_filepath(image))
-        fal_file_url = upload_file(image_path)
+        fal_file_url = await upload_file_async(image_path)
 
     return {"key": [node_id, "inputs", "image"], "url": fal_file_url}
 
@@ -75,7 +154,7 @@ async def upload_file_load_video(node_id, node_data, dry_run=False):
         fal_file_url = video
     else:
         video_path = Path(folder_paths.get_annotated_filepath(video))
-        fal_file_url = upload_file(video_path)
+        fal_file_url = await upload_file_async(video_path)
 
     return {"key": [node_id, "inputs", "video"], "url": fal_file_url}
 
@@ -93,8 +172,7 @@ async def upload_file_load_audio(node_id, node_data, node_class_type, dry_run=Fa
         fal_file_url = audio
     else:
         audio_path = Path(folder_paths.get_annotated_filepath(audio))
-
-        fal_file_url = upload_file(audio_path)
+        fal_file_url = await upload_file_async(audio_path)
 
     return {"key": [node_id, "inputs", input_key], "url": fal_file_url}
 
@@ -107,32 +185,33 @@ async def upload_input_files(
     load_audio_nodes = ["LoadAudio", "VHS_LoadAudio", "VHS_LoadAudioUpload"]
     load_nodes = load_image_nodes + load_video_nodes + load_audio_nodes
 
-    file_urls = []
+    uploads = []
 
     for node_id, node_data in prompt_data.items():
         node_class_type = node_data["class_type"]
-        file_data = None
 
         if node_class_type not in load_nodes:
             continue
 
         if node_class_type in load_image_nodes:
-            file_data = await upload_file_load_image(
-                node_id, node_data, dry_run=dry_run
-            )
+            upload = upload_file_load_image(node_id, node_data, dry_run=dry_run)
         elif node_class_type in load_video_nodes:
-            file_data = await upload_file_load_video(
-                node_id, node_data, dry_run=dry_run
-            )
+            upload = upload_file_load_video(node_id, node_data, dry_run=dry_run)
         elif node_class_type in load_audio_nodes:
-            file_data = await upload_file_load_audio(
+            upload = upload_file_load_audio(
                 node_id, node_data, node_class_type, dry_run=dry_run
             )
 
+        uploads.append((node_class_type, upload))
+
+    # Uploads run concurrently, bounded by the size of the upload worker pool.
+    # gather keeps the results in workflow order.
+    file_urls = await asyncio.gather(*(upload for _, upload in uploads))
+
+    for (node_class_type, _), file_data in zip(uploads, file_urls):
         file_data["class_type"] = node_class_type
-        file_urls.append(file_data)
 
-    return file_urls
+    return list(file_urls)
 
 
 @PromptServer.instance.routes.post("/fal/execute")
@@ -163,51 +242,185 @@ async def execute_prompt(request):
             data=error_message,
         )
 
-    async with httpx.AsyncClient() as client:
-        try:
-            await emit_event(
-                "fal-info", {"message": "Executing the workflow"}, client_id
-            )
-            await emit_events(client, payload, client_id)
+    client = get_http_client()
+
+    try:
+        await emit_event(
+            "fal-info", {"message": "Executing the workflow"}, client_id
+        )
+        await emit_events(client, payload, client_id)
+        return web.json_response(status=200)
+
+    except httpx.HTTPStatusError as error:
+        error_response = {"error": f"HTTP error occurred: {str(error)}"}
+        return web.json_response(
+            status=error.response.status_code,
+            data=error_response,
+        )
+
+    except httpx.RequestError as error:
+        # A fix to handle incomplete chunked read error
+        # We are not sure why this error occurs, but it seems to be harmless
+        if (
+            str(error)
+            == "peer closed connection without sending complete message body (incomplete chunked read)"
+        ):
             return web.json_response(status=200)
 
-        except httpx.HTTPStatusError as error:
-            error_response = {"error": f"HTTP error occurred: {str(error)}"}
-            return web.json_response(
-                status=error.response.status_code,
-                data=error_response,
-            )
+        error_response = {"error": f"Request error occurred: {str(error)}"}
+        return web.json_response(
+            status=500,
+            data=error_response,
+        )
 
-        except httpx.RequestError as error:
-            # A fix to handle incomplete chunked read error
-            # We are not sure why this error occurs, but it seems to be harmless
-            if (
-                str(error)
-                == "peer closed connection without sending complete message body (incomplete chunked read)"
-            ):
-                return web.json_response(status=200)
+    except ComfyClientError as error:
+        error_data = error.args[0]
+        error_code = error_data.get("code", 500)
+        error_message = error_data.get("error", "An unexpected error occurred")
+        return web.json_response(
+            status=error_code,
+            data=error_message,
+        )
 
-            error_response = {"error": f"Request error occurred: {str(error)}"}
-            return web.json_response(
-                status=500,
-                data=error_response,
-            )
+    except Exception as error:
+        error_response = {"error": f"An unexpected error occurred: {str(error)}"}
+        return web.json_response(
+            status=500,
+            data=error_response,
+        )
 
-        except ComfyClientError as error:
-            error_data = error.args[0]
-            error_code = error_data.get("code", 500)
-            error_message = error_data.get("error", "An unexpected error occurred")
-            return web.json_response(
-                status=error_code,
-                data=error_message,
-            )
 
-        except Exception as error:
-            error_response = {"error": f"An unexpected error occurred: {str(error)}"}
-            return web.json_response(
-                status=500,
-                data=error_response,
-            )
+@PromptServer.instance.routes.get("/fal/http-client")
+async def get_http_client_pool_stats(request):
+    return web.json_response(status=200, data=get_http_client_stats())
+
+
+PromptServer.instance.app.on_cleanup.append(close_http_client)
+
+
+@PromptServer.instance.routes.get("/fal/download-stats")
+async def get_model_weights_download_stats(request):
+    return web.json_response(status=200, data=get_download_stats())
+
+
+@PromptServer.instance.routes.get("/fal/node-caches")
+async def get_node_cache_stats(request):
+    return web.json_response(status=200, data=get_cache_stats())
+
+
+@PromptServer.instance.routes.get("/fal/weights")
+async def get_model_weights_usage(request):
+    loop = asyncio.get_running_loop()
+    usage = await loop.run_in_executor(None, get_weights_usage)
+    return web.json_response(status=200, data=usage)
+
+
+async def read_json_object(request) -> dict | None:
+    """Parse the body of ``request`` as a JSON object. An empty body is an
+    empty object; a body that is not a JSON object returns None."""
+    if not request.can_read_body:
+        return {}
+
+    try:
+        request_data = await request.json()
+    except ValueError:
+        return None
+
+    return request_data if isinstance(request_data, dict) else None
+
+
+@PromptServer.instance.routes.post("/fal/weights/trim")
+async def trim_model_weights_cache(request):
+    request_data = await read_json_object(request)
+    if request_data is None:
+        return web.json_response(
+            status=400, data={"error": "Request body must be a JSON object"}
+        )
+
+    max_size = request_data.get("max_size")
+    if max_size is not None and (
+        not isinstance(max_size, int) or isinstance(max_size, bool) or max_size < 0
+    ):
+        return web.json_response(
+            status=400, data={"error": "max_size must be a non-negative integer"}
+        )
+
+    loop = asyncio.get_running_loop()
+    evicted = await loop.run_in_executor(None, trim_model_weights, max_size)
+    return web.json_response(status=200, data={"evicted": evicted})
+
+
+def prefetch_prompt_weights(json_data):
+    # Start downloading the weights of remote loaders as soon as a prompt is
+    # queued, so they are on disk by the time the loaders execute.
+    try:
+        prefetch_workflow_weights(json_data.get("prompt", {}))
+    except Exception as e:
+        print(f"Failed to prefetch model weights: {e}")
+
+    return json_data
+
+
+if hasattr(PromptServer.instance, "add_on_prompt_handler"):
+    PromptServer.instance.add_on_prompt_handler(prefetch_prompt_weights)
+
+
+@PromptServer.instance.routes.get("/fal/upload-cache")
+async def get_upload_cache_stats(request):
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(None, get_upload_cache().stats)
+    return web.json_response(status=200, data=stats)
+
+
+@PromptServer.instance.routes.get("/fal/image-cache")
+async def get_image_cache_stats(request):
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(None, get_image_cache().stats)
+    return web.json_response(status=200, data=stats)
+
+
+@PromptServer.instance.routes.post("/fal/prefetch")
+async def prefetch_weights(request):
+    request_data = await read_json_object(request)
+    if request_data is None:
+        return web.json_response(
+            status=400, data={"error": "Request body must be a JSON object"}
+        )
+
+    urls = request_data.get("urls", [])
+    workflows = request_data.get("workflows", [])
+    if not isinstance(urls, list) or not isinstance(workflows, list):
+        return web.json_response(
+            status=400, data={"error": "'urls' and 'workflows' must be lists"}
+        )
+
+    remote_weights = [(0, url) for url in urls if isinstance(url, str) and url]
+    for workflow in workflows:
+        if isinstance(workflow, dict):
+            # Saved fal format workflows keep the API workflow under "prompt".
+            api_workflow = workflow.get("prompt", workflow)
+            remote_weights.extend(get_remote_weights(api_workflow))
+
+    # The same URL may be listed more than once, keep its highest priority.
+    priorities = {}
+    for priority, url in remote_weights:
+        priorities[url] = min(priority, priorities.get(url, priority))
+    remote_weights = sorted((priority, url) for url, priority in priorities.items())
+
+    prefetcher = get_weights_prefetcher()
+    job_id = prefetcher.submit_job(remote_weights)
+    return web.json_response(
+        status=202, data={"job_id": job_id, "items": prefetcher.get_job(job_id)}
+    )
+
+
+@PromptServer.instance.routes.get("/fal/prefetch/{job_id}")
+async def get_prefetch_status(request):
+    items = get_weights_prefetcher().get_job(request.match_info["job_id"])
+    if items is None:
+        return web.json_response(status=404, data={"error": "Unknown prefetch job"})
+
+    return web.json_response(status=200, data={"items": items})
 
 
 @PromptServer.instance.routes.post("/fal/save")
@@ -398,7 +611,7 @@ async def emit_events(client: httpx.AsyncClient, payload: dict, client_id: str):
         url=fal_endpoint,
         json=payload,
         headers=headers,
-        # timeout=120,
+        extensions=get_trace_extension(),
     ) as event_source:
         try:
             async for event in event_source.aiter_sse():
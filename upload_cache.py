@@ -0,0 +1,131 @@
+import functools
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from .config import get_cache_dir, get_upload_cache_ttl
+
+UPLOAD_CACHE_FILE_NAME = "uploads.sqlite"
+
+
+class UploadCache:
+    """Maps file content hashes to fal URLs.
+
+    The cache lives in an SQLite database so it survives restarts and is shared
+    by every ComfyUI process on the host. Hit/miss counters are stored next to
+    the entries for the same reason.
+
+    It also indexes file hashes by (path, size, mtime_ns, inode), so files that
+    did not change since they were last hashed are never read again.
+    """
+
+    def __init__(self, db_path: Path, ttl: float):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._file_hashes: dict[tuple, str] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._init_lock:
+            if not self._initialized:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+        with self._init_lock:
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS uploads ("
+                    "hash TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, uploaded_at REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS file_hashes ("
+                    "path TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "mtime_ns INTEGER NOT NULL, inode INTEGER NOT NULL, "
+                    "hash TEXT NOT NULL, PRIMARY KEY (path, size, mtime_ns, inode))"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS stats ("
+                    "name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                self._initialized = True
+
+        return connection
+
+    def _increment(self, connection: sqlite3.Connection, **counters: int):
+        connection.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            counters.items(),
+        )
+
+    def get(self, file_hash: str, size: int) -> str | None:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT url, uploaded_at FROM uploads WHERE hash = ?", (file_hash,)
+            ).fetchone()
+
+            if row is None or time.time() - row[1] > self.ttl:
+                self._increment(connection, misses=1)
+                return None
+
+            self._increment(connection, hits=1, bytes_saved=size)
+            return row[0]
+
+    def set(self, file_hash: str, url: str, size: int):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO uploads (hash, url, size, uploaded_at) "
+                "VALUES (?, ?, ?, ?)",
+                (file_hash, url, size, time.time()),
+            )
+            self._increment(connection, bytes_uploaded=size)
+
+    def get_file_hash(self, file_key: tuple[str, int, int, int]) -> str | None:
+        file_hash = self._file_hashes.get(file_key)
+        if file_hash is not None:
+            return file_hash
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT hash FROM file_hashes "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                file_key,
+            ).fetchone()
+
+        if row is not None:
+            self._file_hashes[file_key] = row[0]
+            return row[0]
+
+        return None
+
+    def set_file_hash(self, file_key: tuple[str, int, int, int], file_hash: str):
+        self._file_hashes[file_key] = file_hash
+
+        with closing(self._connect()) as connection:
+            # Older stat entries for the same path can never match again.
+            connection.execute("DELETE FROM file_hashes WHERE path = ?", (file_key[0],))
+            connection.execute(
+                "INSERT INTO file_hashes (path, size, mtime_ns, inode, hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (*file_key, file_hash),
+            )
+
+    def stats(self) -> dict[str, int]:
+        with closing(self._connect()) as connection:
+            stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "bytes_uploaded": 0}
+            stats.update(connection.execute("SELECT name, value FROM stats"))
+            stats["entries"] = connection.execute(
+                "SELECT COUNT(*) FROM uploads"
+            ).fetchone()[0]
+            return stats
+
+
+@functools.cache
+def get_upload_cache() -> UploadCache:
+    return UploadCache(get_cache_dir() / UPLOAD_CACHE_FILE_NAME, get_upload_cache_ttl())
@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import NamedTuple
+
+MANIFEST_FILE_NAME = "manifest.sqlite"
+
+# Access times are written back at most this often per entry, so cache hits do
+# not turn into database writes.
+_ACCESS_WRITE_INTERVAL = 60
+
+
+class WeightsEntry(NamedTuple):
+    url_hash: str
+    url: str
+    file_name: str
+    path: str
+    size: int
+    sha256: str | None
+    etag: str | None
+    last_modified: str | None
+    validated: bool
+    last_access: float = 0.0
+    access_count: int = 0
+    # Files owned by another cache (e.g. the Hugging Face hub cache), which
+    # are indexed here but never evicted.
+    external: bool = False
+
+
+_COLUMNS = ", ".join(WeightsEntry._fields)
+
+_COLUMN_DEFINITIONS = {
+    "last_access": "REAL NOT NULL DEFAULT 0",
+    "access_count": "INTEGER NOT NULL DEFAULT 0",
+    "external": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def _row_to_entry(row: tuple) -> WeightsEntry:
+    entry = WeightsEntry(*row)
+    return entry._replace(
+        validated=bool(entry.validated), external=bool(entry.external)
+    )
+
+
+class WeightsManifest:
+    """Index of the model weights directory.
+
+    Every downloaded and validated file is recorded here, so a cache hit is a
+    single lookup instead of a directory scan plus reopening the file. Entries
+    are kept in memory after the first lookup and in an SQLite database shared
+    by every process on the host.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._entries: dict[str, WeightsEntry] = {}
+        self._written_access: dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._init_lock:
+            if not self._initialized:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+        with self._init_lock:
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS weights ("
+                    "url_hash TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                    "file_name TEXT NOT NULL, path TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, sha256 TEXT, etag TEXT, "
+                    "last_modified TEXT, validated INTEGER NOT NULL DEFAULT 0, "
+                    "created_at REAL NOT NULL)"
+                )
+                existing_columns = {
+                    row[1] for row in connection.execute("PRAGMA table_info(weights)")
+                }
+                for column, definition in _COLUMN_DEFINITIONS.items():
+                    if column not in existing_columns:
+                        connection.execute(
+                            f"ALTER TABLE weights ADD COLUMN {column} {definition}"
+                        )
+                self._initialized = True
+
+        return connection
+
+    def get(self, url_hash: str) -> WeightsEntry | None:
+        entry = self._entries.get(url_hash)
+        if entry is not None:
+            return entry
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT {_COLUMNS} FROM weights WHERE url_hash = ?", (url_hash,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry = _row_to_entry(row)
+        self._entries[url_hash] = entry
+        return entry
+
+    def set(self, entry: WeightsEntry):
+        now = time.time()
+        entry = entry._replace(
+            last_access=entry.last_access or now,
+            access_count=max(entry.access_count, 1),
+        )
+
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO weights ({_COLUMNS}, created_at) "
+                f"VALUES ({', '.join('?' * len(WeightsEntry._fields))}, ?)",
+                (
+                    *entry._replace(
+                        validated=int(entry.validated), external=int(entry.external)
+                    ),
+                    now,
+                ),
+            )
+
+        self._entries[entry.url_hash] = entry
+        self._written_access[entry.url_hash] = now
+
+    def touch(self, url_hash: str):
+        entry = self._entries.get(url_hash)
+        if entry is None:
+            return
+
+        now = time.time()
+        self._entries[url_hash] = entry._replace(
+            last_access=now, access_count=entry.access_count + 1
+        )
+
+        pending_accesses = self._entries[url_hash].access_count
+        if now - self._written_access.get(url_hash, 0) < _ACCESS_WRITE_INTERVAL:
+            return
+
+        self._written_access[url_hash] = now
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE weights SET last_access = ?, "
+                "access_count = MAX(access_count, ?) WHERE url_hash = ?",
+                (now, pending_accesses, url_hash),
+            )
+
+    def remove(self, url_hash: str):
+        self._entries.pop(url_hash, None)
+        self._written_access.pop(url_hash, None)
+
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM weights WHERE url_hash = ?", (url_hash,))
+
+    def entries(self) -> list[WeightsEntry]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(f"SELECT {_COLUMNS} FROM weights").fetchall()
+
+        # Accesses not written back yet are newer than what the database has.
+        return [
+            max(
+                _row_to_entry(row),
+                self._entries.get(row[0], _row_to_entry(row)),
+                key=lambda entry: entry.last_access,
+            )
+            for row in rows
+        ]